@@ -0,0 +1,204 @@
+from sys import exit, version_info
+from os import devnull
+from os.path import basename, dirname, join
+from time import perf_counter
+from statistics import median
+from tempfile import mkdtemp
+from shutil import rmtree
+from contextlib import redirect_stdout
+from argparse import ArgumentParser
+from importlib.metadata import version
+import gc
+import json
+import tracemalloc
+
+from music21_piano_validation import (ExtractedScore, build_hand_part, build_piano_score, compile_constraints, create_constraints,
+                                      extract_timeline, feasibility_cache, find_scores, fix_ties_and_rests, hand_template, peak_memory,
+                                      score_dynamics, sounding_score, split_timeline, split_timeline_dp, sweep_timeline)
+
+# stages of the pipeline in the order they run
+STAGES = ('parse', 'extract', 'template', 'split', 'build_hand_part', 'fix_ties_and_rests', 'assembly', 'write')
+
+# baseline file format version
+BASELINE_VERSION = 1
+
+# times the stages of one run of the pipeline, and with trace_memory also records the most memory each stage
+# allocated on top of what was already allocated when it started (tracing slows everything down, so the runs that are
+# timed do not trace)
+class StageTimer:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = {}
+        self.memory = {}
+
+    # runs one stage of the pipeline
+    # returns: the stage's result
+    def run(self, stage, function, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        result = function(*args)
+        self.seconds[stage] = self.seconds.get(stage, 0) + perf_counter() - start
+        if self.trace_memory:
+            peak = (tracemalloc.get_traced_memory()[1] - allocated) / (1024 * 1024)
+            self.memory[stage] = max(self.memory.get(stage, 0), peak)
+        return result
+
+# runs the pipeline of process_score on one score like the command line does, one stage at a time
+# returns: void
+def run_pipeline(score, constraints, output_file, timer, extractor='sweep', splitter='greedy'):
+    from music21 import converter
+    song = timer.run('parse', converter.parse, score)
+    run_stages(song, constraints, output_file, timer, extractor, splitter)
+
+# runs the stages of the pipeline after parsing on a music21 score, leaving out the write without an output file
+# the feasibility cache is emptied first so every run splits the score like the first one
+# returns: void
+def run_stages(song, constraints, output_file, timer, extractor='sweep', splitter='greedy'):
+    feasibility_cache.clear()
+
+    # chordify, or the sweep that replaces it, plus the dynamics copied to the output
+    if extractor == 'chordify':
+        def extract():
+            combined = song.chordify()
+            return extract_timeline(combined), combined.template, score_dynamics(song)
+    else:
+        def extract():
+            sounding = sounding_score(song)
+            return sweep_timeline(sounding), lambda: hand_template(sounding), score_dynamics(song)
+    timeline, make_hand_template, dynamics = timer.run('extract', extract)
+    extracted = ExtractedScore(len(song.parts), timeline, make_hand_template, dynamics, lambda: song.metadata)
+
+    right_hand = timer.run('template', make_hand_template)
+    left_hand = timer.run('template', make_hand_template)
+    split = split_timeline_dp if splitter == 'dp' else split_timeline
+    right_hand_records, left_hand_records, _ = timer.run('split', split, timeline, constraints, [])
+    timer.run('build_hand_part', build_hand_part, right_hand, right_hand_records)
+    timer.run('build_hand_part', build_hand_part, left_hand, left_hand_records)
+    timer.run('fix_ties_and_rests', fix_ties_and_rests, left_hand)
+    timer.run('fix_ties_and_rests', fix_ties_and_rests, right_hand)
+    piano_score = timer.run('assembly', build_piano_score, extracted, right_hand, left_hand)
+    if output_file is not None:
+        timer.run('write', piano_score.write, 'musicxml', output_file)
+
+# benchmarks one score: warmup untimed runs, then repeats timed runs, then (with trace_memory) one run tracing memory
+# returns: {'seconds': {stage: median, ...}, 'min_seconds': {stage: fastest, ...}, 'memory': {stage: MB, ...}}
+def benchmark_score(score, constraints, output_file, warmup=1, repeats=3, trace_memory=True, **options):
+    runs = []
+    with open(devnull, 'w') as quiet, redirect_stdout(quiet):
+        for i in range(warmup + repeats):
+            gc.collect()
+            timer = StageTimer()
+            run_pipeline(score, constraints, output_file, timer, **options)
+            if i >= warmup:
+                runs.append(timer.seconds)
+        memory = {}
+        if trace_memory:
+            gc.collect()
+            timer = StageTimer(trace_memory=True)
+            tracemalloc.start()
+            try:
+                run_pipeline(score, constraints, output_file, timer, **options)
+            finally:
+                tracemalloc.stop()
+            memory = timer.memory
+
+    seconds = {stage: median(run[stage] for run in runs) for stage in STAGES}
+    seconds['total'] = median(sum(run.values()) for run in runs)
+    min_seconds = {stage: min(run[stage] for run in runs) for stage in STAGES}
+    return {'seconds': seconds, 'min_seconds': min_seconds, 'memory': memory}
+
+# compares results with a baseline, a stage regresses when it takes (or allocates) more than threshold times the
+# baseline more, and at least min_seconds (or min_memory MB) more, so stages that only take a few milliseconds do not
+# fail on noise
+# returns: [(score, stage, 'seconds' or 'memory', baseline, current), ...]
+def find_regressions(results, baseline, threshold, min_seconds, min_memory):
+    regressions = []
+    for score, result in results['scores'].items():
+        baseline_result = baseline['scores'].get(score)
+        if baseline_result is None:
+            continue
+        for measure, minimum in (('seconds', min_seconds), ('memory', min_memory)):
+            for stage, current in result[measure].items():
+                old = baseline_result[measure].get(stage)
+                if old is not None and current > old * (1 + threshold) and current - old >= minimum:
+                    regressions.append((score, stage, measure, old, current))
+    return regressions
+
+# prints the table of one score's stages
+# returns: void
+def print_result(score, result):
+    print(f'\n{score}')
+    print(f'  {"stage":<20}{"median s":>10}{"min s":>10}{"peak MB":>10}')
+    for stage in STAGES + ('total',):
+        fastest = result['min_seconds'].get(stage)
+        memory = result['memory'].get(stage)
+        print(f'  {stage:<20}{result["seconds"][stage]:>10.3f}'
+              f'{"" if fastest is None else f"{fastest:.3f}":>10}{"" if memory is None else f"{memory:.1f}":>10}')
+
+def main(argv=None):
+    here = dirname(__file__)
+    parser = ArgumentParser(description='Times each stage of the piano validation pipeline over some scores.')
+    parser.add_argument('scores', nargs='*', default=[join(here, 'examples')],
+                        help='score files, directories or globs (default: the examples directory)')
+    parser.add_argument('--constraints', default=join(here, 'finger_constraints.txt'), help='finger constraint file')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs of each score before the timed ones')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs of each score, the median of which is reported')
+    parser.add_argument('--extractor', choices=['sweep', 'chordify'], default='sweep', help='how the parts are combined into chords')
+    parser.add_argument('--splitter', choices=['greedy', 'dp'], default='greedy', help='how the chords are split into hands')
+    parser.add_argument('--no-memory', action='store_true', help='skip the extra run that records the memory of each stage')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the results to this json file as the baseline to compare with')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with this baseline and exit with status 1 if a stage regressed')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fraction a stage may take or allocate over the baseline before it counts as a regression (default: 0.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.02, help='smallest slowdown of a stage that counts as a regression')
+    parser.add_argument('--min-memory', type=float, default=1.0, help='smallest growth in MB of a stage that counts as a regression')
+    args = parser.parse_args(argv)
+    if args.repeats < 1:
+        parser.error('--repeats must be at least 1')
+
+    scores = [score for pattern in args.scores for score in find_scores(pattern)]
+    if not scores:
+        parser.error('no scores found')
+    constraints = compile_constraints(create_constraints(args.constraints))
+    results = {'version': BASELINE_VERSION, 'python': '.'.join(map(str, version_info[:3])), 'music21': version('music21'),
+               'extractor': args.extractor, 'splitter': args.splitter, 'warmup': args.warmup, 'repeats': args.repeats, 'scores': {}}
+    output_directory = mkdtemp()
+    try:
+        for score in scores:
+            result = benchmark_score(score, constraints, join(output_directory, 'benchmark.musicxml'), args.warmup, args.repeats,
+                                     not args.no_memory, extractor=args.extractor, splitter=args.splitter)
+            results['scores'][basename(score)] = result
+            print_result(basename(score), result)
+    finally:
+        rmtree(output_directory, ignore_errors=True)
+    results['peak_memory'] = peak_memory()
+    if results['peak_memory'] is not None:
+        print(f'\nPeak memory: {results["peak_memory"]:.0f} MB')
+
+    for file in (args.output, args.save_baseline):
+        if file is not None:
+            with open(file, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BASELINE_VERSION:
+            parser.error(f'{args.baseline} is not a baseline of this version of the benchmark')
+        if (baseline['extractor'], baseline['splitter']) != (args.extractor, args.splitter):
+            print('\nWarning: the baseline was recorded with a different extractor or splitter')
+        regressions = find_regressions(results, baseline, args.threshold, args.min_seconds, args.min_memory)
+        if regressions:
+            print(f'\n{len(regressions)} stage(s) regressed past {args.threshold:.0%} of the baseline:')
+            for score, stage, measure, old, current in regressions:
+                unit = 's' if measure == 'seconds' else ' MB'
+                print(f'  {score} {stage}: {old:.3f}{unit} -> {current:.3f}{unit}')
+            return 1
+        print('\nNo stage regressed')
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -1,553 +1,2963 @@
-from sys import argv, platform
-from music21 import *
-from copy import deepcopy
-
-COLOR_ERROR = '#ED1111'
-COLOR_CORRECT = '#000000'
-
-# colors notes red to indicate they are impossible to play
-# colors notes black to indicate they are possible to play
-def color_notes(left_hand_notes, right_hand_notes, color):
-    for note_object in left_hand_notes:
-        note_object.style.color = color
-    for note_object in right_hand_notes:
-        note_object.style.color = color
-
-# checks that tied notes do not connect to the other hand's part
-# returns: tie_issue.pitch
-def check_ties(notes, last_other_notes):
-    for note_object in notes:
-        if note_object.tie is not None and (note_object.tie.type == 'continue' or note_object.tie.type == 'stop'):
-            for lastNote in last_other_notes:
-                if note_object.pitch == lastNote.pitch:
-                    return note_object.pitch
-    return None
-
-# checks the number of fingers and checks the distances between each one, comparing to user constraints
-# returns: hand_is_possible
-def check_constraints(notes, constraints, index_list):
-    two = False
-    if len(index_list) == 2:
-        two = True
-
-    # check finger distance constraints when all fingers are in use
-    if len(index_list) == 5 or two:
-        for constraint in constraints:
-            constraint_index0 = constraint[0]
-            constraint_index1 = constraint[1]
-
-            # if chord is only two fingers, ignore any constraint that isn't pinky and thumb
-            # assumes this will be the largest specified distance, so other constraints are irrelevant
-            if two:
-                if constraint[0] not in [0, 4] or constraint[1] not in [0, 4]:
-                    continue
-                if constraint[0] == 4:
-                    constraint_index0 = 1
-                elif constraint[1] == 4:
-                    constraint_index1 = 1
-
-            # make sure finger distances are within accepted range
-            if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) > constraint[2]:
-                return False
-            # check to see if notes can be different colors at max distance
-            # if not, checks to see if they are max distance and different colors
-            if not constraint[3]:
-                if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) == constraint[2]:
-                    if notes[index_list[constraint_index0]].pitch.alter != notes[index_list[constraint_index1]].pitch.alter:
-                        return False
-        
-        return True
-
-    # check finger distance constraints when 3 fingers are in use
-    # assumes thumb and pinky will always be used as they are assumed the largest gap
-    # best order to check is assumed to be index, ring, middle
-    if len(index_list) == 3:
-        for i in [1, 3, 2]:
-            hand_is_possible = True
-            for constraint in constraints:
-                if constraint[0] not in [0, i, 4] or constraint[1] not in [0, i, 4]:
-                    continue
-                
-                # remapping to keep indices in bounds
-                constraint_index0 = constraint[0]
-                if constraint[0] == 4:
-                    constraint_index0 = 2
-                elif constraint[0] == i:
-                    constraint_index0 = 1
-                    
-                constraint_index1 = constraint[1]
-                if constraint[1] == 4:
-                    constraint_index1 = 2
-                elif constraint[1] == i:
-                    constraint_index1 = 1
-
-                # make sure finger distances are within accepted range
-                if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) > constraint[2]:
-                    hand_is_possible = False
-                # check to see if notes can be different colors at max distance
-                # if not, checks to see if they are max distance and different colors
-                if not constraint[3]:
-                    if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) == constraint[2]:
-                        if notes[index_list[constraint_index0]].pitch.alter != notes[index_list[constraint_index1]].pitch.alter:
-                            hand_is_possible = False
-            if hand_is_possible:
-                return True
-            
-        return False
-    
-    # check finger distance constraints when 4 fingers are in use
-    # assumes thumb and pinky will always be used as they are assumed the largest gap
-    # best order to check is assumed to be index+middle, middle+ring, index+ring
-    for i in [[1, 2], [2, 3], [1, 3]]:
-        hand_is_possible = True
-        for constraint in constraints:
-            if constraint[0] not in [0, i[0], i[1], 4] or constraint[1] not in [0, i[0], i[1], 4]:
-                continue
-            
-            # remapping to keep indices in bounds
-            constraint_index0 = constraint[0]
-            if constraint[0] == 4:
-                constraint_index0 = 3
-            elif constraint[0] == i[0]:
-                constraint_index0 = 1
-            elif constraint[0] == i[1]:
-                constraint_index0 = 2
-                
-            constraint_index1 = constraint[1]
-            if constraint[1] == 4:
-                constraint_index1 = 3
-            elif constraint[1] == i:
-                constraint_index1 = 1
-            elif constraint[1] == i[1]:
-                constraint_index1 = 2
-
-            # make sure finger distances are within accepted range
-            if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) > constraint[2]:
-                hand_is_possible = False
-            # check to see if notes can be different colors at max distance
-            # if not, checks to see if they are max distance and different colors
-            if not constraint[3]:
-                if abs(notes[index_list[constraint_index0]].pitch.midi - notes[index_list[constraint_index1]].pitch.midi) == constraint[2]:
-                    if notes[index_list[constraint_index0]].pitch.alter != notes[index_list[constraint_index1]].pitch.alter:
-                        hand_is_possible = False
-        if hand_is_possible:
-            return True
-        
-    return False
-
-# makes sure no notes are too far away from each other based on the user's finger constraints
-# return: hand_is_possible
-def check_spacing(notes, constraints):
-    index_list = []
-    i = 0
-    # assumes two adjacent white notes can be played by the same finger
-    # also assumes two adjacent black notes can be played by the thumb
-    while i < len(notes) - 1:
-        index_list.append(i)
-        if (abs(notes[i].pitch.midi - notes[i + 1].pitch.midi) < 3):
-            if (0 == notes[i].pitch.alter == notes[i + 1].pitch.alter) or (i == 0 and notes[i].pitch.alter == notes[i + 1].pitch.alter):
-                i += 1
-        i += 1
-    # keep pinky as final index no matter what
-    if len(index_list) > 0 and index_list[-1] == i - 2:
-        index_list.pop()
-    index_list.append(len(notes) - 1)
-
-    # assumed impossible if number of fingers required is greater than 5
-    if len(index_list) > 5:
-        return False
-    
-    # assumed possible if number if fingers required is 0 or 1
-    if len(index_list) < 2:
-        return True
-
-    # custom function in spacing_checker.py
-    return check_constraints(notes, constraints, index_list)
-
-
-# check if either hand has notes that are impossible to play and attempt to fix them
-# assumes all notes in the left hand are lower in pitch than all notes in the right hand
-# returns: left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue
-def adjust_chord(left_hand_notes, right_hand_notes, last_left_notes, last_right_notes, constraints):
-    left_possible = False
-    right_possible = False
-    left_prev = True
-    right_prev = True
-    tie_loop = False
-    tie_issue = False
-    last_left_tie_issue = None
-    last_right_tie_issue = None
-
-    left_hand_notes.reverse()
-
-    # iteratively try to fix problems with each hand until both hands are possible or they cannot be fixed.
-    while not left_possible or not right_possible or tie_issue:
-        tie_issue = False
-        left_tie_issue = check_ties(left_hand_notes, last_right_notes)
-        if left_tie_issue is None:
-            left_possible = check_spacing(left_hand_notes, constraints)
-        else:
-            tie_issue = True
-            left_possible = False
-
-        right_tie_issue = check_ties(right_hand_notes, last_left_notes)
-        if right_tie_issue is None:
-            right_possible = check_spacing(right_hand_notes, constraints)
-        else:
-            tie_issue = True
-            right_possible = False
-
-        # prevent back and forth infinite loop
-        if left_possible != left_prev and right_possible != right_prev:
-            if not tie_issue or tie_loop:
-                color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
-                return left_hand_notes, right_hand_notes, False, last_left_tie_issue, last_right_tie_issue
-            elif tie_issue:
-                tie_loop = True
-
-        left_prev = left_possible
-        right_prev = right_possible
-
-        if not left_possible:
-            if not right_possible:
-                    # if both hands are impossible, the chord cannot be played
-                    color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
-                    return left_hand_notes, right_hand_notes, False, last_left_tie_issue, last_right_tie_issue
-
-            right_hand_notes.insert(0, left_hand_notes.pop(0))
-
-        elif not right_possible:
-            left_hand_notes.insert(0, right_hand_notes.pop(0))
-
-        last_left_tie_issue = left_tie_issue
-        last_right_tie_issue = right_tie_issue
-
-    color_notes(left_hand_notes, right_hand_notes, COLOR_CORRECT)
-    return left_hand_notes, right_hand_notes, True, None, None
-
-# If a chord is impossible due to ties, attempt to switch tied notes between hands to fix it
-# assumes it is best to move other notes as well to ensure that all notes in the left hand remain
-# lower in pitch than all notes in the right hand
-# returns: void
-def switch_ties(destination_hand, problem_hand, tie_issue, measure_number, constraints, move_up, switch_back=True):
-    overall_success = True
-    cur_measure_number = measure_number
-
-    old_errors = 0
-    new_errors = 0
-
-    # travel backwards through chords and measures until the start of the tie
-    while True:
-        problem_chords = []
-        for problem_chord_object in problem_hand.measure(cur_measure_number).getElementsByClass(chord.Chord):
-            problem_chords.append(problem_chord_object)
-        problem_chords.reverse()
-
-        chord_index = 0
-        for problem_chord_object in problem_chords:
-
-            tie_type = None
-            chord_index -= 1
-
-            elements = []
-            for problem_note_object in problem_chord_object.notes:
-                # Note is above/below the tie issue and should be moved
-                if (problem_note_object.pitch >= tie_issue and move_up) or (problem_note_object.pitch <= tie_issue and not move_up):
-
-                    # check if this note is the tied note we are looking for
-                    if problem_note_object.pitch == tie_issue:
-                        tie_type = problem_note_object.tie.type
-                        if problem_note_object.style.color == COLOR_ERROR:
-                            old_errors += 1
-
-                    # flip the note to the destination hand
-                    problem_chord_object.remove(problem_note_object)
-                    elements = list(destination_hand.measure(cur_measure_number).getElementsByClass((chord.Chord, note.Rest)))
-                    if elements[chord_index].isRest:
-                        elements[chord_index] = chord.Chord()
-                        elements[chord_index].quarterLength = problem_note_object.quarterLength
-                    elements[chord_index].add(deepcopy(problem_note_object))
-
-            if len(elements) != 0:
-                # check possible chords and recolor accordingly
-                notes_to_check = list(elements[chord_index].notes)
-                if move_up:
-                    notes_to_check.reverse()
-                destination_possible = check_spacing(elements[chord_index].notes, constraints)
-                if not destination_possible:
-                    color_notes(elements[chord_index].notes, problem_chord_object.notes, COLOR_ERROR)
-                    overall_success = False
-                    new_errors += 1
-                else:
-                    color_notes(elements[chord_index].notes, problem_chord_object.notes, COLOR_CORRECT)
-
-            # return when all chords with tie have been flipped
-            # switch back if function created more errors for clarity
-            if tie_type is not None and tie_type == 'start':
-                if switch_back and new_errors >= old_errors:
-                    _ = switch_ties(problem_hand, destination_hand, tie_issue, measure_number, constraints, not move_up, switch_back=False)
-                    print(f'Reverting tied note {tie_issue} move')
-                return overall_success
-
-        cur_measure_number -= 1
-
-# find the best place to split a chord into two hands
-# assumes the best starting point is the gap between notes
-# returns: left_hand_notes, right_hand_notes
-def find_split_point(chord_object):
-    equal_ties = True
-
-    # split at the largest interval between notes
-    if(equal_ties):
-        greatest_interval = -1
-        split_index = -1
-        i = 0
-        while i < len(chord_object.notes) - 1:
-            current_interval = chord_object.notes[i + 1].pitch.midi - chord_object.notes[i].pitch.midi
-            if current_interval >= greatest_interval:
-                greatest_interval = current_interval
-                split_index = i
-            i += 1
-
-    left_hand_notes = [chord_object.notes[i] for i in range(0, split_index + 1)]
-    right_hand_notes = [chord_object.notes[i] for i in range(split_index + 1, len(chord_object.notes))]
-
-    return left_hand_notes, right_hand_notes
-
-# main function to check if piece can be played by a piano
-# Traverses measure by measure/chord by chord, calling functions on the chords
-# Adds resulting chords to left- and right-hand parts
-# Also adds rests to prevent rhythm issues
-# returns: overall_success
-def check_playability(combined, right_hand, left_hand, constraints):
-    overall_success = True
-
-    last_left_notes = []
-    last_right_notes = []
-
-    # traverse by measures because Partstaffs need you to do that that
-    for measure in combined.getElementsByClass(stream.Measure):
-        right_measure = right_hand.measure(measure.number)
-        left_measure = left_hand.measure(measure.number)
-
-        # clear out any existing rests because otherwise notes will be added on top of them, extending the measure
-        for rest in right_measure.getElementsByClass('Rest'):
-            right_measure.remove(rest)
-        for rest in left_measure.getElementsByClass('Rest'):
-            left_measure.remove(rest)
-
-        # handle the actual rests
-        rests = measure.getElementsByClass('Rest')
-        for rest_object in rests:
-            rest = note.Rest()
-            rest.quarterLength = rest_object.quarterLength
-            left_measure.insert(rest_object.offset, rest)
-            rest = note.Rest()
-            rest.quarterLength = rest_object.quarterLength
-            right_measure.insert(rest_object.offset, rest)
-
-        # traverse chords
-        chords = measure.recurse().getElementsByClass(chord.Chord)
-        for chord_object in chords:
-            # assign notes to left and right parts
-            # single note chords (not really chords but whatever) are played by the right hand
-            left_hand_notes, right_hand_notes = find_split_point(chord_object)
-
-            # make sure both hands can actually play the notes they have
-            left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue = adjust_chord(left_hand_notes, right_hand_notes, last_left_notes, last_right_notes, constraints)
-
-            # deep copy notes to avoid reference issues
-            # notes from both hands are references to the same chord object which causes problems later
-            left_hand_notes = deepcopy(left_hand_notes)
-            right_hand_notes = deepcopy(right_hand_notes)
-
-            # insert notes into respective measures
-            if left_hand_notes == []:
-                rest = note.Rest()
-                rest.quarterLength = chord_object.quarterLength
-                left_measure.insert(chord_object.offset, rest)
-                left_chord = chord.Chord()
-            else:
-                left_chord = chord.Chord(left_hand_notes)
-                left_chord.quarterLength = chord_object.quarterLength
-                left_measure.insert(chord_object.offset, left_chord)
-            if right_hand_notes == []:
-                rest = note.Rest()
-                rest.quarterLength = chord_object.quarterLength
-                right_measure.insert(chord_object.offset, rest)
-                right_chord = chord.Chord()
-            else:
-                right_chord = chord.Chord(right_hand_notes)
-                right_chord.quarterLength = chord_object.quarterLength
-                right_measure.insert(chord_object.offset, right_chord)
-
-            if not success:
-                # checks if failure is due to a tied note being forced into one hand by seeing if the
-                # previous tied notes can be switched to the other hand to fix the issue
-                if left_tie_issue is not None:
-                    print(f'Switching tied note {left_tie_issue} from right hand to left hand - Measure: {measure.number} Offset: {chord_object.offset}')
-                    overall_success = switch_ties(left_hand, right_hand, left_tie_issue, measure.number, constraints, False) and overall_success
-                elif right_tie_issue is not None:
-                    print(f'Switching tied note {right_tie_issue} from left hand to right hand - Measure: {measure.number} Offset: {chord_object.offset}')
-                    overall_success = switch_ties(right_hand, left_hand, right_tie_issue, measure.number, constraints, True) and overall_success
-                else:
-                    overall_success = False
-                    print(f'Impossible chord - Measure: {measure.number} Offset: {chord_object.offset}')
-
-            last_left_notes = left_chord.notes
-            last_right_notes = right_chord.notes
-
-    # fix tie weirdness (more details in function)
-    fix_ties_and_rests(left_hand)
-    fix_ties_and_rests(right_hand)
-    return overall_success
-
-# this function combines tied notes and rests where possible to make the resulting music easier to read
-# the .chordify() function combines all notes into chords in a single partstaff object
-# this creates ties anywhere two notes with different lengths are played at the same time
-# when splitting the chords into two hands, many unnecessary ties are left over
-def fix_ties_and_rests(part):
-    for measure in part.getElementsByClass(stream.Measure):
-        chords = measure.getElementsByClass(chord.Chord)
-        i = len(chords) - 1
-
-        # go backwards from the end of the measure merging tied notes where possible
-        while i > 0:
-            merge = True
-            # dont merge unless all notes are tied from the previous chord
-            for note_object in chords[i].notes:
-                if note_object.style.color == COLOR_ERROR or note_object.tie is None or note_object.tie.type == 'start':
-                    merge = False
-            # make sure the previous chord's notes are all tied to the current chord
-            if merge:
-                for note_object in chords[i - 1].notes:
-                    if note_object.style.color == COLOR_ERROR or note_object.tie is None or note_object.tie.type == 'stop':
-                        merge = False
-            # combine chords
-            if merge:
-                chords[i - 1].quarterLength += chords[i].quarterLength
-                measure.remove(chords[i])
-                chords = measure.getElementsByClass(chord.Chord)
-            i -= 1
-
-        # simpler version for rests
-        rests = measure.getElementsByClass(note.Rest)
-        i = len(rests) - 1
-        while i > 0:
-            if rests[i - 1].offset + rests[i - 1].quarterLength == rests[i].offset:
-                rests[i - 1].quarterLength += rests[i].quarterLength
-                measure.remove(rests[i])
-                rests = measure.getElementsByClass(note.Rest)
-            i -= 1
-
-# reads finger_constraint file and creates list of constraints
-# returns: [[finger1, finger2, max_distance, max_can_be_different_colors], [...], ...]
-def create_constraints(file):
-    constraints = []
-    finger_map = {
-        'thumb': 0,
-        'index': 1,
-        'middle': 2,
-        'ring': 3,
-        'pinky': 4
-    }
-    with open(file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            parts = line.split(',')
-
-            finger1 = finger_map[parts[0].strip().strip('\'')]
-            finger2 = finger_map[parts[1].strip().strip('\'')]
-
-            max_distance = int(parts[2].split('=')[1].strip())
-            max_can_be_different_colors = parts[3].split('=')[1].strip()
-            max_can_be_different_colors = True if max_can_be_different_colors == 'True' else False
-
-            constraints.append([finger1, finger2, max_distance, max_can_be_different_colors])
-
-    return constraints
-        
-
-# set up the environment
-if platform == 'win32':
-    # Windows
-    path = 'C:/Program Files/MuseScore 4/bin/Musescore4.exe' # (TODO?: not hardcode the musicxml reader path?)
-elif platform == 'darwin':
-    # Mac OS - TODO
-    pass
-else:
-    # assume Linux
-    path = '/usr/bin/musescore'
-env = environment.Environment()
-env['musicxmlPath'] = path
-
-argc = len(argv)
-if argc < 3:
-    print('arguments: [original score file] [output name (no extension)] optional: [finger constraint file]')
-else:
-    if argc > 3:
-        print('Reading finger constraints...')
-        constraints = create_constraints(argv[3])
-    else:
-        print('No constraints specified')
-        constraints = []
-
-    song = converter.parse(argv[1])
-    print(f'\nStarting at {len(song.parts)} parts...\n')
-
-    # combine all parts into one PartStaff
-    combined = song.chordify()
-
-    # create empty parts for right and left hand
-    right_hand = combined.template()
-    left_hand = combined.template()
-    
-    # main function
-    success = check_playability(combined, right_hand, left_hand, constraints)
-
-    # create empty final score
-    final = stream.Score()
-
-    # create piano staff grouping
-    piano_staff = layout.StaffGroup([right_hand, left_hand], name='Piano', symbol='brace')
-
-    # set clefs for left hand
-    left_hand.getElementsByClass(stream.Measure)[0].removeByClass(clef.Clef)
-    left_hand.getElementsByClass(stream.Measure)[0].insert(0, clef.BassClef())
-
-    # set instruments for both hands
-    instruments_right = [inst for inst in right_hand.recurse().getElementsByClass(instrument.Instrument)]
-    instruments_left = [inst for inst in left_hand.recurse().getElementsByClass(instrument.Instrument)]
-    for inst in instruments_right + instruments_left:
-        inst.activeSite.remove(inst)
-
-    right_hand.insert(0, instrument.Piano())
-    left_hand.insert(0, instrument.Piano())
-
-    # insert dynamics
-    for measure in song.parts[0].getElementsByClass(stream.Measure):
-        for dynamic in measure.getElementsByClass(dynamics.Dynamic):
-            new_dynamic = dynamics.Dynamic()
-            new_dynamic.value = dynamic.value
-            right_hand.measure(measure.number).insert(dynamic.offset, new_dynamic)
-
-    # assemble final score
-    final.insert(0, piano_staff)
-    final.append(right_hand)
-    final.append(left_hand)
-
-    # set metadata
-    final.insert(0, metadata.Metadata())
-    final.metadata = song.metadata
-    final.parts[0].partName = 'Pno'
-    final.parts[1].partName = 'Pno'
-
-    # write output file
-    final.write('musicxml', argv[2] + '.musicxml')
-    if success:
-        print('\nPiece can be played by a piano.\n')
-    else:
-        print('\nPiece cannot be played by a piano.\n')
+from sys import platform, exit, stdout, stderr
+from os import cpu_count, getpid, listdir, makedirs, remove, replace, stat, utime
+from os.path import basename, commonpath, expanduser, isdir, isfile, join, realpath, splitext
+from glob import glob
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from threading import Lock
+from signal import signal, SIGINT, SIG_IGN
+from tempfile import mkdtemp, TemporaryFile
+from shutil import copyfileobj, rmtree
+from copy import deepcopy
+from urllib.parse import urlsplit, parse_qs
+from math import floor, isclose
+from fractions import Fraction
+from zipfile import ZipFile
+from xml.etree.ElementTree import Comment, Element, iterparse, tostring
+import json
+import pickle
+from hashlib import sha256
+from importlib.metadata import version
+
+COLOR_ERROR = '#ED1111'
+COLOR_CORRECT = '#000000'
+
+# maximum number of hand voicings remembered by the feasibility cache
+FEASIBILITY_CACHE_SIZE = 4096
+
+# files picked up when a directory is given to --batch
+SCORE_EXTENSIONS = ('.xml', '.mxl', '.musicxml')
+
+# version of the timeline cache entries, to be bumped whenever extraction or the cached form changes
+TIMELINE_CACHE_VERSION = 3
+# timeline cache location and size limit in bytes
+TIMELINE_CACHE_DIRECTORY = join(expanduser('~'), '.cache', 'music21_piano_validation')
+TIMELINE_CACHE_SIZE = 256 * 1024 * 1024
+
+# version of the split store used by --incremental, to be bumped whenever splitting or the stored form changes
+SPLIT_STORE_VERSION = 4
+
+# note names in staff order and their semitones above C
+STEPS = 'CDEFGAB'
+STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+# alter and name modifier of each music21 accidental
+ACCIDENTALS = {
+    'natural': (0.0, ''), 'sharp': (1.0, '#'), 'double-sharp': (2.0, '##'), 'triple-sharp': (3.0, '###'),
+    'quadruple-sharp': (4.0, '####'), 'flat': (-1.0, '-'), 'double-flat': (-2.0, '--'), 'triple-flat': (-3.0, '---'),
+    'quadruple-flat': (-4.0, '----'), 'half-sharp': (0.5, '~'), 'one-and-a-half-sharp': (1.5, '#~'),
+    'half-flat': (-0.5, '`'), 'one-and-a-half-flat': (-1.5, '-`')
+}
+ACCIDENTAL_NAMES = {alter: name for name, (alter, _) in ACCIDENTALS.items()}
+# musicxml accidentals music21 gives another name
+MUSICXML_ACCIDENTALS = {'quarter-sharp': 'half-sharp', 'three-quarters-sharp': 'one-and-a-half-sharp', 'quarter-flat': 'half-flat',
+                        'three-quarters-flat': 'one-and-a-half-flat', 'flat-flat': 'double-flat', 'sharp-sharp': 'double-sharp'}
+# staff steps music21 spells a transposition given only in semitones with (0 to 11 semitones)
+CHROMATIC_STAFF_STEPS = (0, 1, 1, 2, 2, 3, 4, 4, 5, 5, 6, 6)
+# denominator limit music21 puts on offsets and durations
+QUARTER_LENGTH_DENOMINATOR_LIMIT = 65535
+# musicxml divisions per quarter note music21 assumes when a score does not give them
+DEFAULT_DIVISIONS = 10080
+
+# measures of the piano score built and written at a time with --stream-output
+STREAMED_CHUNK_MEASURES = 32
+
+# jobs the validation service takes per worker process (waiting or running) before it turns new ones away
+SERVICE_JOBS_PER_WORKER = 4
+# number of recent jobs the validation service's latency statistics are taken from
+SERVICE_LATENCY_WINDOW = 1000
+# largest score file in bytes the validation service accepts as a request body
+SERVICE_MAX_BODY_SIZE = 64 * 1024 * 1024
+
+# number of slowest measures listed in the --instrument report
+INSTRUMENT_SLOWEST_MEASURES = 10
+
+# bounded LRU cache of check_spacing results
+# chordified scores repeat the same voicings many times, so a hand that has already been checked
+# against a set of constraints only costs a dictionary lookup the next time it appears
+class FeasibilityCache:
+    def __init__(self, max_size=FEASIBILITY_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+
+    # returns: hand_is_possible, or None if the key has not been checked yet
+    def get(self, key):
+        hand_is_possible = self.entries.get(key)
+        if hand_is_possible is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return hand_is_possible
+
+    def put(self, key, hand_is_possible):
+        self.entries[key] = hand_is_possible
+        self.entries.move_to_end(key)
+        # evict the least recently used voicing once the cache is full
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+feasibility_cache = FeasibilityCache()
+
+# counters and timers of the splitting hot path (see --instrument)
+# they are only recorded while instrumentation is set, otherwise the hot path only checks that it is None
+class Instrumentation:
+    def __init__(self):
+        self.counters = {}
+        self.seconds = {}
+        self.measure_seconds = {}
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def time(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+
+    # a measure split again (by a fallback or another pass) adds to its time
+    def time_measure(self, measure_number, seconds):
+        self.measure_seconds[measure_number] = self.measure_seconds.get(measure_number, 0) + seconds
+
+    # returns: {'counters': {...}, 'seconds': {...}, 'slowest_measures': [{'measure': ..., 'seconds': ...}, ...]}
+    def report(self, slowest=INSTRUMENT_SLOWEST_MEASURES):
+        measures = sorted(self.measure_seconds.items(), key=lambda item: item[1], reverse=True)[:slowest]
+        return {'counters': dict(sorted(self.counters.items())), 'seconds': dict(sorted(self.seconds.items())),
+                'slowest_measures': [{'measure': measure_number, 'seconds': seconds} for measure_number, seconds in measures]}
+
+instrumentation = None
+
+# starts recording the counters and timers of the hot path in this process
+# returns: Instrumentation
+def start_instrumentation():
+    global instrumentation
+    instrumentation = Instrumentation()
+    return instrumentation
+
+# stops recording them
+# returns: the Instrumentation that was recording, or None
+def stop_instrumentation():
+    global instrumentation
+    stopped, instrumentation = instrumentation, None
+    return stopped
+
+# compact stand-in for a music21 note, used while the hands are split
+# music21 notes are only created again when the hand parts are built (see build_hand_part)
+class NoteRecord:
+    __slots__ = ('name', 'step', 'octave', 'accidental', 'midi', 'alter', 'ps', 'cents', 'tie', 'duration', 'offset', 'error')
+
+    def __init__(self, name, step, octave, accidental, midi, alter, ps, cents, tie, duration, offset, error=False):
+        self.name = name
+        self.step = step
+        self.octave = octave
+        self.accidental = accidental
+        self.midi = midi
+        self.alter = alter
+        self.ps = ps
+        self.cents = cents
+        self.tie = tie
+        self.duration = duration
+        self.offset = offset
+        self.error = error
+
+    # the name of the pitch with its microtone, like music21 prints a pitch
+    def __str__(self):
+        if not self.cents:
+            return self.name
+        from music21 import pitch
+        return self.name + str(pitch.Microtone(self.cents))
+
+    # returns: NoteRecord
+    def copy(self):
+        return NoteRecord(self.name, self.step, self.octave, self.accidental, self.midi, self.alter, self.ps,
+                          self.cents, self.tie, self.duration, self.offset, self.error)
+
+# a chord or a rest in a measure, rests have no notes
+class EventRecord:
+    __slots__ = ('offset', 'duration', 'notes')
+
+    def __init__(self, offset, duration, notes=None):
+        self.offset = offset
+        self.duration = duration
+        self.notes = notes
+
+    # returns: is_rest
+    def is_rest(self):
+        return self.notes is None
+
+# one measure of the combined score: its rests and its chords in order
+class MeasureRecord:
+    __slots__ = ('number', 'rests', 'chords')
+
+    def __init__(self, number, rests, chords):
+        self.number = number
+        self.rests = rests
+        self.chords = chords
+
+# a chord that could not be split between the hands
+# reason is 'spacing' when a hand cannot reach its notes and 'tie' when a tied note could not be moved to fix it
+class ChordFailure:
+    __slots__ = ('measure', 'offset', 'pitches', 'reason')
+
+    def __init__(self, measure, offset, pitches, reason):
+        self.measure = measure
+        self.offset = offset
+        self.pitches = pitches
+        self.reason = reason
+
+    # returns: {'measure': ..., 'offset': ..., 'pitches': [...], 'reason': ...}
+    def as_dict(self):
+        return {'measure': self.measure, 'offset': float(self.offset), 'pitches': list(self.pitches), 'reason': self.reason}
+
+# offset or duration in the form music21 keeps them: a float when it is exact, otherwise a fraction
+# (music21's common.opFrac)
+# returns: quarter_length
+def quarter_length(value):
+    if isinstance(value, int):
+        return value + 0.0
+    if isinstance(value, float):
+        numerator, denominator = value.as_integer_ratio()
+        if denominator <= QUARTER_LENGTH_DENOMINATOR_LIMIT:
+            return value
+        value = Fraction(numerator, denominator).limit_denominator(QUARTER_LENGTH_DENOMINATOR_LIMIT)
+    if value.denominator & (value.denominator - 1) == 0:
+        return value.numerator / value.denominator
+    return value
+
+# the fields of a note record that come from a music21 pitch
+# the name leaves out the microtone, like the nameWithOctave chordify merges unisons by
+# returns: (name, step, octave, accidental, midi, alter, ps, cents)
+def pitch_fields(pitch_object):
+    accidental_name = pitch_object.accidental.name if pitch_object.accidental is not None else None
+    cents = 0.0 if pitch_object.isTwelveTone() else pitch_object.microtone.cents
+    return (pitch_object.nameWithOctave, pitch_object.step, pitch_object.octave, accidental_name,
+            pitch_object.midi, pitch_object.alter, pitch_object.ps, cents)
+
+# converts a music21 pitch into a note record
+# returns: NoteRecord
+def record_pitch(pitch_object, tie_type, duration, offset):
+    return NoteRecord(*pitch_fields(pitch_object), tie_type, duration, offset)
+
+# converts a music21 note into a note record
+# returns: NoteRecord
+def record_note(note_object, offset):
+    tie_type = note_object.tie.type if note_object.tie is not None else None
+    return record_pitch(note_object.pitch, tie_type, note_object.quarterLength, offset)
+
+# reads the chordified score into measure records
+# returns: [MeasureRecord, ...]
+def extract_timeline(combined):
+    from music21 import chord, stream
+    timeline = []
+    for measure in combined.getElementsByClass(stream.Measure):
+        rests = [EventRecord(rest.offset, rest.quarterLength) for rest in measure.getElementsByClass('Rest')]
+        chords = []
+        for chord_object in measure.recurse().getElementsByClass(chord.Chord):
+            notes = [record_note(note_object, chord_object.offset) for note_object in chord_object.notes]
+            chords.append(EventRecord(chord_object.offset, chord_object.quarterLength, notes))
+        timeline.append(MeasureRecord(measure.number, rests, chords))
+    return timeline
+
+# the score at sounding pitch, which is what chordify works from
+# returns: score
+def sounding_score(song):
+    from music21 import stream
+    if song.hasPartLikeStreams() and song.getElementsByClass(stream.Stream).first().atSoundingPitch is False:
+        return song.toSoundingPitch(inPlace=False)
+    if song.atSoundingPitch is False:
+        return song.toSoundingPitch(inPlace=False)
+    return song
+
+# collects the notes, chords and rests of a measure (including the ones in voices) as spans
+# offsets are relative to the measure, and each note is kept as its pitch fields and tie type
+# returns: void
+def collect_spans(container, container_offset, spans):
+    from music21 import chord, common, note, stream
+    for element in container:
+        offset = common.opFrac(container_offset + container.elementOffset(element))
+        if isinstance(element, stream.Stream):
+            collect_spans(element, offset, spans)
+        elif isinstance(element, note.GeneralNote):
+            if isinstance(element, chord.ChordBase):
+                notes = [note_object for note_object in element if isinstance(note_object, note.Note)]
+            elif isinstance(element, note.Note):
+                notes = [element]
+            else:
+                notes = []
+            spans.append((offset, common.opFrac(offset + element.quarterLength),
+                          [(pitch_fields(note_object.pitch), note_object.tie.type if note_object.tie is not None else None)
+                           for note_object in notes]))
+
+# tie of a note cut down to one time slice, a note sounding through several slices is tied across them
+# follows the tie rules chordify uses so both extractions agree
+# returns: tie_type
+def slice_tie(tie_type, note_offset, note_end, slice_offset, slice_end):
+    if note_offset < slice_offset:
+        added_tie = 'continue' if note_end > slice_end else 'stop'
+    elif note_end > slice_end:
+        added_tie = 'start'
+    else:
+        added_tie = None
+
+    if tie_type == 'continue' or added_tie is None:
+        return tie_type
+    if tie_type is not None and {tie_type, added_tie} == {'start', 'stop'}:
+        return 'continue'
+    return added_tie
+
+# two parts sounding the same pitch in a slice are played as one note
+# like chordify, the note with the more useful tie is kept (continue, then start or stop, then none)
+# returns: fields, tie_type
+def merge_unison(kept, fields, tie_type):
+    kept_fields, kept_tie = kept
+    if kept_tie == 'continue' or tie_type is None:
+        return kept
+    if kept_tie is None or tie_type == 'continue':
+        return fields, tie_type
+    if {kept_tie, tie_type} == {'start', 'stop'}:
+        return kept_fields, 'continue'
+    return kept
+
+# position of a pitch on the staff, music21's diatonicNoteNum
+# returns: diatonic_number
+def diatonic_number(fields):
+    return fields[2] * 7 + STEPS.index(fields[1]) + 1
+
+# sweeps over the onsets and releases of one measure's spans and cuts them into time slices
+# every slice becomes a chord of the sounding pitches, or a rest (consecutive rests are merged)
+# returns: MeasureRecord
+def sweep_measure(measure_number, spans):
+    time_points = sorted({point for offset, end, notes in spans for point in (offset, end)} | {0})
+    spans.sort(key=lambda span: span[0])
+    next_span = 0
+    active = []
+
+    rests = []
+    chords = []
+    rest_offset = None
+    rest_duration = 0
+    for offset, end in zip(time_points, time_points[1:]):
+        if isclose(offset, end, abs_tol=1e-7):
+            continue
+
+        # a span sounds in the slice if it starts at the slice or is still held through it
+        while next_span < len(spans) and spans[next_span][0] <= offset:
+            active.append(spans[next_span])
+            next_span += 1
+        active = [span for span in active if span[0] == offset or span[1] > offset]
+
+        duration = quarter_length(end - offset)
+        sounding = {}
+        # spans starting here come first, then the held ones, the order chordify visits them in
+        for note_offset, note_end, notes in sorted(active, key=lambda span: (span[0] != offset, span[0], span[1])):
+            for fields, tie_type in notes:
+                tie_type = slice_tie(tie_type, note_offset, note_end, offset, end)
+                name = fields[0]
+                if name in sounding:
+                    sounding[name] = merge_unison(sounding[name], fields, tie_type)
+                else:
+                    sounding[name] = (fields, tie_type)
+
+        if not sounding:
+            if rest_offset is None:
+                rest_offset = offset
+            rest_duration = quarter_length(rest_duration + duration)
+            continue
+        if rest_offset is not None:
+            rests.append(EventRecord(rest_offset, rest_duration))
+            rest_offset = None
+            rest_duration = 0
+
+        # same order as a music21 chord (diatonic ascending)
+        pitches = sorted(sounding.values(), key=lambda item: (diatonic_number(item[0]), item[0][6]))
+        notes = [NoteRecord(*fields, tie_type, duration, offset) for fields, tie_type in pitches]
+        chords.append(EventRecord(offset, duration, notes))
+
+    if rest_offset is not None:
+        rests.append(EventRecord(rest_offset, rest_duration))
+    return MeasureRecord(measure_number, rests, chords)
+
+# empty copy of the first part's measures (clefs, key and time signatures...) to build a hand in
+# the same layout chordify's result would give
+# returns: part
+def hand_template(song):
+    return song.parts[0].template(retainVoices=False)
+
+# reads the score into measure records directly from its parts, without building song.chordify()
+# uses the measures of the first part like chordify, so the records match extract_timeline(song.chordify())
+# returns: [MeasureRecord, ...]
+def sweep_timeline(song):
+    from music21 import stream
+    part_measures = [list(part.getElementsByClass(stream.Measure)) for part in song.parts]
+    timeline = []
+    for i, measure in enumerate(part_measures[0]):
+        spans = []
+        for measures in part_measures:
+            if i < len(measures):
+                collect_spans(measures[i], 0, spans)
+        timeline.append(sweep_measure(measure.number, spans))
+    return timeline
+
+# the fields of a note record for a pitch read straight from musicxml, worked out like music21's Pitch
+# music21 reads no microtones from musicxml (an <alter> that is not a known accidental is an error), so cents is 0
+# returns: (name, step, octave, accidental, midi, alter, ps, cents)
+def musicxml_pitch_fields(step, octave, alter, accidental_name):
+    modifier = ACCIDENTALS[accidental_name][1] if accidental_name in ACCIDENTALS else ''
+    ps = float((octave + 1) * 12 + STEP_SEMITONES[step] + alter)
+    midi = floor(ps + 0.5)
+    if midi > 127:
+        midi = 108 + midi % 12
+        if midi < 115:
+            midi += 12
+    elif midi < 0:
+        midi %= 12
+    return f'{step}{modifier}{octave}', step, octave, accidental_name, midi, alter, ps, 0.0
+
+# the pitch of a musicxml <note>, read like music21's xmlToPitch
+# an <accidental> keeps its name even when <alter> gives the note a different alter
+# returns: step, octave, alter, accidental_name
+def musicxml_pitch(note_element):
+    pitch_element = note_element.find('pitch')
+    step = pitch_element.findtext('step', '').strip()
+    octave = int(pitch_element.findtext('octave', '4'))
+    alter_text = pitch_element.findtext('alter', '').strip()
+    alter = float(alter_text) if alter_text else None
+
+    accidental_text = note_element.findtext('accidental', '').strip().lower()
+    if accidental_text:
+        accidental_name = MUSICXML_ACCIDENTALS.get(accidental_text, accidental_text)
+        if alter is None:
+            alter = ACCIDENTALS[accidental_name][0] if accidental_name in ACCIDENTALS else 0.0
+        return step, octave, alter, accidental_name
+    if alter is not None:
+        if alter not in ACCIDENTAL_NAMES:
+            raise ValueError(f'incorrect accidental {alter} for pitch {step}{octave}')
+        return step, octave, alter, ACCIDENTAL_NAMES[alter]
+    return step, octave, 0.0, None
+
+# the tie type of a musicxml <note>, like music21's xmlToTie (a note both ending and starting a tie continues it)
+# returns: tie_type, or None when the note is not tied
+def musicxml_tie(note_element):
+    ties = note_element.findall('tie')
+    if not ties:
+        return None
+    types = [tie.get('type') for tie in ties if tie.get('type') is not None]
+    if len(types) == 1:
+        return types[0]
+    if 'start' in types and 'stop' in types:
+        return 'continue'
+    return 'start'
+
+# the interval of a musicxml <transpose> as (staff steps, semitones), like music21's xmlTransposeToInterval
+# a transposition given only in semitones is spelled the way music21 spells it (a tritone as a diminished fifth)
+# returns: (staff_steps, semitones), or None when it gives no semitones to transpose by
+def musicxml_transposition(transpose):
+    diatonic = transpose.findtext('diatonic')
+    chromatic = transpose.findtext('chromatic')
+    octaves = int(transpose.findtext('octave-change', '0'))
+    if chromatic is None:
+        return (0, 0) if diatonic is None else None
+    semitones = int(chromatic) + octaves * 12
+    if diatonic is not None:
+        return int(diatonic) + octaves * 7, semitones
+    staff_steps = CHROMATIC_STAFF_STEPS[abs(semitones) % 12] + abs(semitones) // 12 * 7
+    return staff_steps if semitones >= 0 else -staff_steps, semitones
+
+# transposes a written pitch to sounding pitch like music21's Interval.transposePitch (used by toSoundingPitch)
+# returns: step, octave, alter, accidental_name
+def transpose_pitch(step, octave, alter, accidental_name, transposition):
+    staff_steps, semitones = transposition
+    new_octave, index = divmod(octave * 7 + STEPS.index(step) + staff_steps, 7)
+    new_step = STEPS[index]
+    half_steps = (octave - new_octave) * 12 + STEP_SEMITONES[step] - STEP_SEMITONES[new_step] + alter + semitones
+    if half_steps == 0:
+        # only unisons and octaves keep a natural sign
+        octaves_only = staff_steps % 7 == 0 and semitones == staff_steps // 7 * 12
+        return new_step, new_octave, 0.0, 'natural' if octaves_only and accidental_name == 'natural' else None
+    while half_steps >= 12:
+        half_steps -= 12
+        new_octave -= 1
+    return new_step, new_octave, float(half_steps), ACCIDENTAL_NAMES.get(half_steps)
+
+# length of a musicxml <note>, <forward> or <backup> in quarter notes (grace notes take no time)
+# returns: length
+def musicxml_length(element, divisions):
+    if element.find('grace') is not None:
+        return Fraction(0)
+    duration = element.findtext('duration', '').strip()
+    return Fraction(duration) / divisions if duration else Fraction(0)
+
+# bar length in quarter notes of a musicxml <time> (3+2 beats and several signatures are added up)
+# returns: bar_length, or None for a time signature without beats
+def musicxml_bar_length(time):
+    beats = [element.text for element in time.findall('beats')]
+    beat_types = [element.text for element in time.findall('beat-type')]
+    if not beats or len(beats) != len(beat_types):
+        return None
+    return sum(sum(Fraction(beat) for beat in beat_group.split('+')) * 4 / Fraction(beat_type)
+               for beat_group, beat_type in zip(beats, beat_types))
+
+# measure number and suffix of a musicxml <measure>, like music21 (the digits make the number, the rest the suffix)
+# returns: number, suffix
+def musicxml_measure_number(text):
+    digits = ''.join(character for character in text if character.isdigit())
+    return int(digits) if digits else 0, ''.join(character for character in text if not character.isdigit())
+
+# whether music21 would give a rest of this length and type a plain whole or breve duration (no dots or tuplets)
+# returns: plain_whole
+def plain_whole_rest(rest_element, length):
+    note_type = rest_element.findtext('type', '').strip() if rest_element is not None else ''
+    if not note_type:
+        return length in (4, 8)
+    return (note_type in ('whole', 'breve') and rest_element.find('dot') is None
+            and rest_element.find('time-modification') is None)
+
+# what a part's earlier measures leave in effect while its later ones are read
+class MusicXMLPartState:
+    def __init__(self, transposed):
+        self.transposed = transposed
+        self.divisions = Fraction(DEFAULT_DIVISIONS)
+        self.bar_length = None
+        self.transposition = None
+        self.has_transposition = False
+        self.staves = 1
+        self.last_number = None
+        # spans of the part's last measure so far, and the index of the hidden rest finale's closing <forward> left in it
+        self.last_spans = None
+        self.ending_forward = None
+
+# reads one musicxml <measure> of a part into spans like collect_spans gives for the measure music21 parses from it
+# offsets follow music21's MeasureParser: chords advance once complete, <backup> never goes before the barline, and
+# in scores written by finale every <forward> leaves a hidden rest
+# full measure rests are stretched to the bar and empty measures get one, the way music21's PartParser does it
+# returns: [(offset, end, [(fields, tie_type), ...]), ...]
+def read_musicxml_measure(measure, state, finale):
+    elements = list(measure)
+    voices = sorted({element.findtext('voice').strip() for element in elements
+                     if element.tag in ('note', 'forward') and element.findtext('voice', '').strip()})
+    use_voices = len(voices) > 1
+
+    # music21 transposes a whole measure by the last transposition set in it
+    for transpose in measure.iterfind('attributes/transpose'):
+        state.transposition = musicxml_transposition(transpose)
+        state.has_transposition = True
+    transposition = state.transposition if state.transposed else None
+
+    # spans as (offset, end, note elements, voice), and for each rest: its span, whether it is marked as a full
+    # measure rest and whether it is a plain whole
+    spans = []
+    rests = []
+    rest_count = 0
+    note_count = 0
+    full_measure_rest = False
+    time_length = None
+    offset = Fraction(0)
+    chord_elements = []
+    ending_forward = None
+    last_voice = None
+    for i, element in enumerate(elements):
+        # music21 files an element without <voice> in the voice of the one before it
+        if element.findtext('voice', '').strip():
+            last_voice = element.findtext('voice').strip()
+        if element.tag == 'attributes':
+            divisions = element.findtext('divisions', '').strip()
+            if divisions:
+                state.divisions = Fraction(divisions)
+            staves = element.findtext('staves', '').strip()
+            if staves:
+                state.staves = max(state.staves, int(staves))
+            time = element.find('time')
+            if time is not None and offset == 0 and time_length is None:
+                time_length = musicxml_bar_length(time)
+        elif element.tag == 'backup':
+            offset = max(offset - musicxml_length(element, state.divisions), 0)
+        elif element.tag == 'forward' and element.findtext('duration', '').strip():
+            change = musicxml_length(element, state.divisions)
+            if finale:
+                # like music21's Rest(quarterLength=0), a hidden rest of no length lasts a quarter
+                rest_length = change or 1
+                ending_forward = len(spans)
+                rests.append((len(spans), False, plain_whole_rest(None, rest_length)))
+                spans.append((offset, offset + rest_length, None, last_voice))
+            offset += change
+        elif element.tag == 'note':
+            next_is_chord = i + 1 < len(elements) and elements[i + 1].tag == 'note' and elements[i + 1].find('chord') is not None
+            increment = 0
+            if element.find('chord') is not None or next_is_chord:
+                chord_elements.append(element)
+            elif element.find('rest') is not None:
+                rest_count += 1
+                increment = musicxml_length(element, state.divisions)
+                note_type = element.findtext('type', '').strip()
+                marked_full = element.find('rest').get('measure') == 'yes' and note_type in ('', 'whole', 'breve')
+                full_measure_rest = full_measure_rest or marked_full
+                rests.append((len(spans), marked_full, plain_whole_rest(element, increment)))
+                spans.append((offset, offset + increment, None, last_voice))
+            else:
+                note_count += 1
+                increment = musicxml_length(element, state.divisions)
+                spans.append((offset, offset + increment, [element], last_voice))
+            if chord_elements and not next_is_chord:
+                increment = musicxml_length(chord_elements[0], state.divisions)
+                chord_voice = next((element.findtext('voice').strip() for element in chord_elements
+                                    if element.findtext('voice', '').strip()), last_voice)
+                spans.append((offset, offset + increment, chord_elements, chord_voice))
+                chord_elements = []
+            offset += increment
+            ending_forward = None
+
+    # the time signature of this measure, or the last one before it
+    if time_length is not None:
+        state.bar_length = time_length
+    bar_length = state.bar_length if state.bar_length is not None else 4
+    if rest_count == 1 and note_count == 0:
+        full_measure_rest = True
+    if full_measure_rest and not use_voices and rests:
+        index, marked_full, plain_whole = min(rests, key=lambda rest: spans[rest[0]][0])
+        rest_offset, rest_end, _, voice = spans[index]
+        if marked_full or (rest_end - rest_offset != bar_length and plain_whole):
+            spans[index] = (rest_offset, rest_offset + bar_length, None, voice)
+    if not spans:
+        spans.append((Fraction(0), bar_length, None, None))
+    state.ending_forward = None if use_voices else ending_forward
+
+    # music21 keeps the notes of each voice together (voices in the order of their numbers, then notes outside a voice)
+    if use_voices:
+        spans.sort(key=lambda span: (voices.index(span[3]) if span[3] in voices else len(voices), span[0]))
+    state.last_spans = [(quarter_length(start), quarter_length(end), musicxml_notes(note_elements, transposition))
+                        for start, end, note_elements, _ in spans]
+    return state.last_spans
+
+# pitch fields and tie types of the pitched notes among some musicxml <note> elements, at sounding pitch
+# returns: [(fields, tie_type), ...]
+def musicxml_notes(note_elements, transposition):
+    notes = []
+    for element in note_elements or ():
+        if element.find('pitch') is None:
+            continue
+        step, octave, alter, accidental_name = musicxml_pitch(element)
+        if transposition is not None:
+            step, octave, alter, accidental_name = transpose_pitch(step, octave, alter, accidental_name, transposition)
+        notes.append((musicxml_pitch_fields(step, octave, alter, accidental_name), musicxml_tie(element)))
+    return notes
+
+# opens the musicxml document of a .xml, .musicxml or compressed .mxl file
+# like music21, the first .xml or .musicxml file outside META-INF is read from an .mxl
+# returns: file
+def open_musicxml(score):
+    if not score.lower().endswith('.mxl'):
+        return open(score, 'rb')
+    with ZipFile(score) as archive:
+        for name in archive.namelist():
+            if 'META-INF' not in name and (splitext(name)[1] in ('.xml', '.musicxml', '.mxl') or name == '.xml'):
+                # the open file keeps the archive's file open until it is closed itself
+                return archive.open(name)
+    raise ValueError(f'{score} does not contain a musicxml file')
+
+# reads a score into measure records straight from its musicxml, without music21, for the validation modes
+# the file is parsed incrementally and every <measure> is dropped as soon as its notes are read, so only the spans
+# (plain tuples) are kept until the last part is read and the measures can be sliced into chords by sweep_measure
+# follows music21's musicxml import wherever it decides when a note sounds or how it is spelled, so the records
+# match sweep_timeline(sounding_score(converter.parse(score))) and extract_timeline of its chordify()
+# returns: part_count, [MeasureRecord, ...], or None for a score only music21 can read (timewise or with chord symbols)
+def stream_timeline(score):
+    part_count = 0
+    finale = False
+    numbers = []
+    # spans of every part for each measure
+    measure_spans = []
+    first_part_transposed = False
+    state = None
+    depth = 0
+    with open_musicxml(score) as f:
+        for event, element in iterparse(f, ('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1 and element.tag != 'score-partwise':
+                    # timewise scores are not streamed
+                    return None
+                if depth == 2 and element.tag == 'part':
+                    # music21 only sounds the transpositions if the first part has one
+                    state = MusicXMLPartState(part_count == 0 or first_part_transposed)
+                    measure_index = 0
+                continue
+            depth -= 1
+
+            if depth == 1 and element.tag == 'identification':
+                # music21 applies its finale workarounds if the first <software> is finale
+                software = [item.text.strip() for item in element.iterfind('encoding/software') if item.text and item.text.strip()]
+                finale = bool(software) and 'Finale' in software[0]
+            elif element.tag == 'harmony':
+                # chord symbols sound in music21's chords, only music21 can realize them
+                return None
+            elif depth == 2 and element.tag == 'measure' and state is not None:
+                spans = read_musicxml_measure(element, state, finale)
+                if part_count == 0:
+                    number, suffix = musicxml_measure_number(element.get('number', ''))
+                    # finale's X measures keep the number of the measure before them
+                    if suffix == 'X' and state.last_number is not None and number != state.last_number + 1:
+                        number = state.last_number
+                    state.last_number = number
+                    numbers.append(number)
+                    measure_spans.append([spans])
+                elif measure_index < len(measure_spans):
+                    measure_spans[measure_index].append(spans)
+                measure_index += 1
+                element.clear()
+            elif depth == 1 and element.tag == 'part':
+                # old finale files close an incomplete last measure with a <forward>, music21 drops its rest
+                if state.ending_forward is not None:
+                    ending_offset = state.last_spans[state.ending_forward][0]
+                    if all(span[0] <= ending_offset for span in state.last_spans):
+                        del state.last_spans[state.ending_forward]
+                if part_count == 0:
+                    first_part_transposed = state.has_transposition
+                part_count += state.staves
+                element.clear()
+
+    timeline = []
+    for i, number in enumerate(numbers):
+        timeline.append(sweep_measure(number, [span for spans in measure_spans[i] for span in spans]))
+        measure_spans[i] = None
+    return part_count, timeline
+
+# normalizes a hand to the pitch information check_spacing depends on
+# order is kept because fingers are assigned starting from the first note (the left hand is checked top down)
+# returns: ((midi, alter), ...)
+def pitch_signature(notes):
+    return tuple((note_object.midi, note_object.alter) for note_object in notes)
+
+# turns a constraint list into something hashable so results for different constraint files never collide
+# returns: ((finger1, finger2, max_distance, max_can_be_different_colors), ...)
+def constraint_fingerprint(constraints):
+    return tuple(tuple(constraint) for constraint in constraints)
+
+# colors notes red to indicate they are impossible to play
+# colors notes black to indicate they are possible to play
+def color_notes(left_hand_notes, right_hand_notes, color):
+    for note_object in left_hand_notes:
+        note_object.error = color == COLOR_ERROR
+    for note_object in right_hand_notes:
+        note_object.error = color == COLOR_ERROR
+
+# identifies a pitch the same way music21's Pitch equality does (same spelling, octave and microtone)
+# returns: (step, octave, accidental_name, cents)
+def pitch_key(note_object):
+    return (note_object.step, note_object.octave, note_object.accidental, note_object.cents)
+
+# music21's Pitch >= : higher in pitch space, or spelled the same
+# returns: is_at_or_above
+def pitch_at_or_above(note_object, other):
+    return note_object.ps > other.ps or pitch_key(note_object) == pitch_key(other)
+
+# music21's Pitch <= : lower in pitch space, or spelled the same
+# returns: is_at_or_below
+def pitch_at_or_below(note_object, other):
+    return note_object.ps < other.ps or pitch_key(note_object) == pitch_key(other)
+
+# sort key music21 uses to keep a chord's notes in ascending order
+# returns: (diatonic_note_number, ps)
+def ascending_key(note_object):
+    return (note_object.octave * 7 + 'CDEFGAB'.index(note_object.step) + 1, note_object.ps)
+
+# checks that tied notes do not connect to the other hand's part
+# last_other_pitches is the set of pitch_keys of the other hand's previous chord
+# returns: tie_issue
+def check_ties(notes, last_other_pitches):
+    for note_object in notes:
+        if note_object.tie == 'continue' or note_object.tie == 'stop':
+            if pitch_key(note_object) in last_other_pitches:
+                return note_object
+    return None
+
+# finger orderings tried for each number of fingers in use, in the order they are tried
+# assumes thumb and pinky will always be used as they are assumed the largest gap
+# 3 fingers: best order to check is assumed to be index, ring, middle
+# 4 fingers: best order to check is assumed to be index+middle, middle+ring, index+ring
+FINGER_ORDERINGS = {
+    2: [[0, 4]],
+    3: [[0, 1, 4], [0, 3, 4], [0, 2, 4]],
+    4: [[0, 1, 2, 4], [0, 2, 3, 4], [0, 1, 3, 4]],
+    5: [[0, 1, 2, 3, 4]]
+}
+
+# constraint set compiled into span tables for each number of fingers in use
+# each table holds one column per (ordering, constraint) pair that applies to that ordering:
+# first/second are positions in the hand's finger list, ordering is the column's ordering index
+class CompiledConstraints:
+    def __init__(self, constraints):
+        import numpy
+        self.constraints = constraints
+        self.fingerprint = constraint_fingerprint(constraints)
+        self.tables = {}
+        for finger_count, orderings in FINGER_ORDERINGS.items():
+            columns = []
+            for ordering_index, ordering in enumerate(orderings):
+                for constraint in constraints:
+                    positions = remap_constraint(constraint, ordering)
+                    if positions is not None:
+                        columns.append((positions[0], positions[1], constraint[2], constraint[3], ordering_index))
+
+            first = numpy.array([column[0] for column in columns], dtype=numpy.intp)
+            second = numpy.array([column[1] for column in columns], dtype=numpy.intp)
+            max_distance = numpy.array([column[2] for column in columns], dtype=numpy.int64)
+            same_color_at_max = numpy.array([not column[3] for column in columns], dtype=bool)
+            # one-hot matrix used to count failed constraints per ordering
+            ordering_matrix = numpy.zeros((len(columns), len(orderings)), dtype=numpy.int64)
+            for column_index, column in enumerate(columns):
+                ordering_matrix[column_index, column[4]] = 1
+
+            self.tables[finger_count] = (first, second, max_distance, same_color_at_max, ordering_matrix)
+
+# maps a constraint's fingers onto positions in a finger ordering
+# with 2 fingers only the thumb and pinky constraint applies (assumed to be the largest specified distance)
+# with 4 fingers the second finger is only remapped when it is the pinky or the upper finger of the pair,
+# which is how the constraints have always been scanned
+# returns: [position1, position2], or None if the constraint does not apply to the ordering
+def remap_constraint(constraint, ordering):
+    if constraint[0] not in ordering or constraint[1] not in ordering:
+        return None
+
+    position0 = ordering.index(constraint[0])
+    if len(ordering) == 4 and constraint[1] == ordering[1]:
+        position1 = constraint[1]
+    else:
+        position1 = ordering.index(constraint[1])
+    return [position0, position1]
+
+# compiles a list of constraints from create_constraints into span tables
+# returns: CompiledConstraints
+def compile_constraints(constraints):
+    return CompiledConstraints(constraints)
+
+# checks the number of fingers and checks the distances between each one, comparing to user constraints
+# checks every hand in a batch of hands that use the same number of fingers at once
+# midi and alter are (hands x fingers) arrays of the notes each finger plays
+# returns: [hand_is_possible, ...]
+def check_constraints(midi, alter, compiled_constraints):
+    import numpy
+    if instrumentation is not None:
+        instrumentation.count(f'check_constraints.calls.{midi.shape[1]}_fingers')
+        instrumentation.count(f'check_constraints.hands.{midi.shape[1]}_fingers', midi.shape[0])
+    first, second, max_distance, same_color_at_max, ordering_matrix = compiled_constraints.tables[midi.shape[1]]
+
+    # make sure finger distances are within accepted range
+    distance = numpy.abs(midi[:, first] - midi[:, second])
+    failed = distance > max_distance
+    # check to see if notes can be different colors at max distance
+    # if not, checks to see if they are max distance and different colors
+    failed |= same_color_at_max & (distance == max_distance) & (alter[:, first] != alter[:, second])
+
+    # a hand is possible if any finger ordering has no failed constraints
+    return ((failed.astype(numpy.int64) @ ordering_matrix) == 0).any(axis=1).tolist()
+
+# makes sure no notes are too far away from each other based on the user's finger constraints
+# results are memoized in the feasibility cache by pitch signature and constraint fingerprint
+# return: hand_is_possible
+def check_spacing(notes, compiled_constraints, cache=feasibility_cache):
+    if instrumentation is not None:
+        instrumentation.count('check_spacing.calls')
+    signature = pitch_signature(notes)
+    key = (signature, compiled_constraints.fingerprint)
+    hand_is_possible = cache.get(key)
+    if hand_is_possible is None:
+        hand_is_possible = check_signature_spacing([signature], compiled_constraints)[0]
+        cache.put(key, hand_is_possible)
+    return hand_is_possible
+
+# decides which notes of a hand need their own finger
+# returns: index_list
+def assign_fingers(signature):
+    index_list = []
+    i = 0
+    # assumes two adjacent white notes can be played by the same finger
+    # also assumes two adjacent black notes can be played by the thumb
+    while i < len(signature) - 1:
+        index_list.append(i)
+        if (abs(signature[i][0] - signature[i + 1][0]) < 3):
+            if (0 == signature[i][1] == signature[i + 1][1]) or (i == 0 and signature[i][1] == signature[i + 1][1]):
+                i += 1
+        i += 1
+    # keep pinky as final index no matter what
+    if len(index_list) > 0 and index_list[-1] == i - 2:
+        index_list.pop()
+    index_list.append(len(signature) - 1)
+    return index_list
+
+# uncached spacing check on a batch of pitch signatures
+# hands are grouped by the number of fingers they need so each group is checked in one vectorized call
+# return: [hand_is_possible, ...]
+def check_signature_spacing(signatures, compiled_constraints):
+    import numpy
+    results = [True] * len(signatures)
+    groups = {}
+    for signature_index, signature in enumerate(signatures):
+        index_list = assign_fingers(signature)
+
+        # assumed impossible if number of fingers required is greater than 5
+        if len(index_list) > 5:
+            results[signature_index] = False
+        # assumed possible if number if fingers required is 0 or 1
+        elif len(index_list) >= 2:
+            groups.setdefault(len(index_list), []).append((signature_index, [signature[i] for i in index_list]))
+
+    if instrumentation is not None:
+        start = perf_counter()
+        instrumentation.count('check_signature_spacing.hands', len(signatures))
+        instrumentation.count('check_signature_spacing.hands.over_5_fingers', sum(1 for result in results if not result))
+    for group in groups.values():
+        fingers = numpy.array([hand for _, hand in group], dtype=numpy.float64)
+        possible = check_constraints(fingers[:, :, 0], fingers[:, :, 1], compiled_constraints)
+        for (signature_index, _), hand_is_possible in zip(group, possible):
+            results[signature_index] = hand_is_possible
+    if instrumentation is not None:
+        instrumentation.time('check_constraints', perf_counter() - start)
+
+    return results
+
+# checks every not yet cached pitch signature in a batch with one call to check_signature_spacing
+# returns: [hand_is_possible, ...]
+def check_signatures_batch(signatures, compiled_constraints, cache=feasibility_cache):
+    keys = [(signature, compiled_constraints.fingerprint) for signature in signatures]
+    results = {}
+    for key in keys:
+        if key not in results:
+            hand_is_possible = cache.get(key)
+            if hand_is_possible is not None:
+                results[key] = hand_is_possible
+
+    unchecked = [key for key in OrderedDict.fromkeys(keys) if key not in results]
+    for key, hand_is_possible in zip(unchecked, check_signature_spacing([key[0] for key in unchecked], compiled_constraints)):
+        cache.put(key, hand_is_possible)
+        results[key] = hand_is_possible
+
+    return [results[key] for key in keys]
+
+# lists the hands of every split of a chord's pitch signature
+# split index k gives the left hand signature[:k] (checked top down) and the right hand signature[k:]
+# returns: [left_signature_0, ..., left_signature_n, right_signature_0, ..., right_signature_n]
+def split_signatures(signature):
+    return [signature[:k][::-1] for k in range(len(signature) + 1)] + [signature[k:] for k in range(len(signature) + 1)]
+
+# evaluates every split index of a chord
+# spacing is the result of check_signatures_batch on the chord's split_signatures, which split_timeline gets for every
+# chord of a measure at once
+# the left hand reports the highest note tied from the right hand's previous chord and the right hand
+# the lowest note tied from the left hand's previous chord, so tie issues are one prefix and one suffix sweep
+# returns: left_possible, right_possible, left_tie_issues, right_tie_issues (lists indexed by split index)
+def evaluate_splits(notes, last_left_pitches, last_right_pitches, spacing):
+    note_count = len(notes)
+    left_possible = spacing[:note_count + 1]
+    right_possible = spacing[note_count + 1:]
+
+    left_tie_issues = [None] * (note_count + 1)
+    for i in range(note_count):
+        tie_issue = check_ties([notes[i]], last_right_pitches)
+        left_tie_issues[i + 1] = tie_issue if tie_issue is not None else left_tie_issues[i]
+
+    right_tie_issues = [None] * (note_count + 1)
+    for i in range(note_count - 1, -1, -1):
+        tie_issue = check_ties([notes[i]], last_left_pitches)
+        right_tie_issues[i] = tie_issue if tie_issue is not None else right_tie_issues[i + 1]
+
+    return left_possible, right_possible, left_tie_issues, right_tie_issues
+
+
+# check if either hand has notes that are impossible to play and attempt to fix them
+# assumes all notes in the left hand are lower in pitch than all notes in the right hand
+# every split of the chord is evaluated once up front, then the split moves one note at a time towards
+# the impossible hand until both hands are possible or they cannot be fixed
+# spacing is the chord's checked split_signatures when the caller has them already, otherwise they are checked here
+# returns: left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue
+def adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints, spacing=None):
+    start = None if instrumentation is None else perf_counter()
+    notes = left_hand_notes + right_hand_notes
+    split_index = len(left_hand_notes)
+    if spacing is None:
+        spacing = check_signatures_batch(split_signatures(pitch_signature(notes)), constraints)
+    left_possible_at, right_possible_at, left_tie_issues, right_tie_issues = evaluate_splits(notes, last_left_pitches, last_right_pitches, spacing)
+
+    left_possible = False
+    right_possible = False
+    left_prev = True
+    right_prev = True
+    tie_loop = False
+    tie_issue = False
+    last_left_tie_issue = None
+    last_right_tie_issue = None
+    success = True
+    iterations = 0
+
+    # iteratively try to fix problems with each hand until both hands are possible or they cannot be fixed.
+    while not left_possible or not right_possible or tie_issue:
+        iterations += 1
+        tie_issue = False
+        left_tie_issue = left_tie_issues[split_index]
+        if left_tie_issue is None:
+            left_possible = left_possible_at[split_index]
+        else:
+            tie_issue = True
+            left_possible = False
+
+        right_tie_issue = right_tie_issues[split_index]
+        if right_tie_issue is None:
+            right_possible = right_possible_at[split_index]
+        else:
+            tie_issue = True
+            right_possible = False
+
+        # prevent back and forth infinite loop
+        if left_possible != left_prev and right_possible != right_prev:
+            if not tie_issue or tie_loop:
+                success = False
+                break
+            elif tie_issue:
+                tie_loop = True
+
+        left_prev = left_possible
+        right_prev = right_possible
+
+        if not left_possible:
+            if not right_possible:
+                # if both hands are impossible, the chord cannot be played
+                success = False
+                break
+
+            # move the highest left hand note to the right hand
+            split_index -= 1
+
+        elif not right_possible:
+            # move the lowest right hand note to the left hand
+            split_index += 1
+
+        last_left_tie_issue = left_tie_issue
+        last_right_tie_issue = right_tie_issue
+
+    # the left hand is listed top down
+    left_hand_notes = notes[:split_index][::-1]
+    right_hand_notes = notes[split_index:]
+
+    if instrumentation is not None:
+        instrumentation.count('adjust_chord.calls')
+        instrumentation.count('adjust_chord.iterations', iterations)
+        instrumentation.time('adjust_chord', perf_counter() - start)
+    if not success:
+        color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
+        return left_hand_notes, right_hand_notes, False, last_left_tie_issue, last_right_tie_issue
+
+    color_notes(left_hand_notes, right_hand_notes, COLOR_CORRECT)
+    return left_hand_notes, right_hand_notes, True, None, None
+
+# inserts an item into a sorted list after any items with an equal key
+# (bisect.insort only accepts a key from Python 3.10)
+# returns: void
+def insort_by_key(items, item, key):
+    item_key = key(item)
+    low = 0
+    high = len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if item_key < key(items[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    items.insert(low, item)
+
+# index of the tie starts in one hand part, built during the forward pass of check_playability
+# maps each tied pitch to the (measure_number, offset, chord, note) positions of its starts, kept sorted by position
+# so the latest start of a tie is found without walking the part (the notes continuing a tie are never looked up)
+class TieStartIndex:
+    def __init__(self):
+        self.starts = {}
+
+    def add(self, measure_number, offset, chord_object, note_object):
+        if note_object.tie != 'start':
+            return
+        insort_by_key(self.starts.setdefault(pitch_key(note_object), []), (measure_number, offset, chord_object, note_object),
+                      lambda start: start[:2])
+
+    # finds the chord holding the latest start of a tie at or before a measure
+    # starts whose note has since been moved to the other hand are dropped along the way
+    # returns: (measure_number, chord), or None if the tie has no start in this hand
+    def find_start(self, tie_note, measure_number):
+        starts = self.starts.get(pitch_key(tie_note), [])
+        i = len(starts) - 1
+        while i >= 0:
+            start_measure_number, _, chord_object, note_object = starts[i]
+            if not any(other is note_object for other in chord_object.notes) or note_object.tie != 'start':
+                del starts[i]
+            elif start_measure_number <= measure_number:
+                return start_measure_number, chord_object
+            i -= 1
+        return None
+
+# index of a music21 part's measures by measure number, built once instead of searching the part on every lookup
+# also keeps an offset sorted list of the chords and rests in each measure, which stays up to date as long as
+# chords and rests are inserted and removed through the index
+class MeasureIndex:
+    def __init__(self, part):
+        from music21 import chord, note, stream
+        self.part = part
+        self.measures = {}
+        self.elements = {}
+        for measure in part.getElementsByClass(stream.Measure):
+            # Part.measure() returns the first measure with a number, so later duplicates are ignored
+            if measure.number not in self.measures:
+                self.measures[measure.number] = measure
+                self.elements[measure.number] = list(measure.getElementsByClass((chord.Chord, note.Rest)))
+
+    # returns: [rest, ...]
+    def rests(self, measure_number):
+        from music21 import note
+        return [element for element in self.elements[measure_number] if isinstance(element, note.Rest)]
+
+    def insert(self, measure_number, offset, element):
+        from music21 import chord, note
+        measure = self.measures[measure_number]
+        measure.insert(offset, element)
+        if isinstance(element, (chord.Chord, note.Rest)):
+            insort_by_key(self.elements[measure_number], element, lambda other: other.sortTuple(measure))
+
+    def remove(self, measure_number, element):
+        from music21 import chord, note
+        self.measures[measure_number].remove(element)
+        if isinstance(element, (chord.Chord, note.Rest)):
+            elements = self.elements[measure_number]
+            # music21 compares notes and rests by value, so remove by identity
+            del elements[next(i for i, other in enumerate(elements) if other is element)]
+
+# one hand while the piece is being split: the chord and rest records of each measure by measure number,
+# kept in offset order (in insertion order at the same offset, like a music21 measure), plus the hand's tie starts
+class HandPart:
+    def __init__(self, measure_numbers):
+        self.measures = {}
+        for measure_number in measure_numbers:
+            self.measures.setdefault(measure_number, [])
+        self.tie_starts = TieStartIndex()
+        # lookups that found no tie start, when split in segments the start may be in an earlier segment
+        self.missing_tie_starts = 0
+
+    # returns: True if the hand has a measure with that number
+    def has_measure(self, measure_number):
+        return measure_number in self.measures
+
+    # returns: [event, ...] in offset order
+    def chords_and_rests(self, measure_number):
+        return self.measures[measure_number]
+
+    # returns: [chord_event, ...]
+    def chords(self, measure_number):
+        return [event for event in self.measures[measure_number] if not event.is_rest()]
+
+    # returns: [rest_event, ...]
+    def rests(self, measure_number):
+        return [event for event in self.measures[measure_number] if event.is_rest()]
+
+    # returns: True if the event is one of the chords or rests in the measure
+    def contains(self, measure_number, event):
+        return any(other is event for other in self.measures.get(measure_number, []))
+
+    def insert(self, measure_number, event):
+        insort_by_key(self.measures[measure_number], event, lambda other: other.offset)
+        if not event.is_rest():
+            self.add_tied_notes(measure_number, event, event.notes)
+
+    def remove(self, measure_number, event):
+        events = self.measures[measure_number]
+        del events[next(i for i, other in enumerate(events) if other is event)]
+
+    # records tied notes that are now part of a chord in this hand
+    def add_tied_notes(self, measure_number, chord_event, notes):
+        for note_object in notes:
+            self.tie_starts.add(measure_number, chord_event.offset, chord_event, note_object)
+
+    # returns: (measure_number, chord_event) of the latest start of a tie at or before a measure, or None
+    def find_tie_start(self, tie_note, measure_number):
+        tie_start = self.tie_starts.find_start(tie_note, measure_number)
+        if tie_start is None:
+            self.missing_tie_starts += 1
+        return tie_start
+
+    # adds the measures of a hand split from the next segment of the timeline
+    def extend(self, other):
+        self.measures.update(other.measures)
+        for key, starts in other.tie_starts.starts.items():
+            self.tie_starts.starts.setdefault(key, []).extend(starts)
+        self.missing_tie_starts += other.missing_tie_starts
+
+    # a hand with the records of only some of the measures (shared, not copied) and no tie starts
+    # returns: HandPart
+    def part_of(self, measure_numbers):
+        hand = HandPart([])
+        hand.measures = {measure_number: self.measures[measure_number] for measure_number in measure_numbers}
+        return hand
+
+# If a chord is impossible due to ties, attempt to switch tied notes between hands to fix it
+# assumes it is best to move other notes as well to ensure that all notes in the left hand remain
+# lower in pitch than all notes in the right hand
+# destination_hand and problem_hand are the HandParts of the two hands
+# log is called with each message (print on the command line)
+# returns: void
+def switch_ties(destination_hand, problem_hand, tie_issue, measure_number, constraints, move_up, switch_back=True, log=print):
+    overall_success = True
+
+    old_errors = 0
+    new_errors = 0
+
+    # look up where the tie starts instead of searching backwards for it
+    tie_start = problem_hand.find_tie_start(tie_issue, measure_number)
+    if instrumentation is not None:
+        instrumentation.count('switch_ties.calls')
+        if tie_start is None:
+            instrumentation.count('switch_ties.missing_tie_starts')
+    if tie_start is None:
+        log(f'Could not find the start of tied note {tie_issue}')
+        return False
+    start_measure_number, start_chord = tie_start
+
+    # travel backwards through chords and measures until the start of the tie
+    for cur_measure_number in range(measure_number, start_measure_number - 1, -1):
+        if not problem_hand.has_measure(cur_measure_number):
+            continue
+        problem_chords = problem_hand.chords(cur_measure_number)
+        problem_chords.reverse()
+
+        chord_index = 0
+        for problem_chord_object in problem_chords:
+
+            chord_index -= 1
+
+            elements = []
+            for problem_note_object in list(problem_chord_object.notes):
+                # Note is above/below the tie issue and should be moved
+                if (pitch_at_or_above(problem_note_object, tie_issue) and move_up) or (pitch_at_or_below(problem_note_object, tie_issue) and not move_up):
+
+                    # check if this note is the tied note we are looking for
+                    if pitch_key(problem_note_object) == pitch_key(tie_issue):
+                        if problem_note_object.error:
+                            old_errors += 1
+
+                    # flip the note to the destination hand
+                    problem_chord_object.notes.remove(problem_note_object)
+                    elements = list(destination_hand.chords_and_rests(cur_measure_number))
+                    if elements[chord_index].is_rest():
+                        elements[chord_index] = EventRecord(elements[chord_index].offset, problem_note_object.duration, [])
+                    # the destination chord stays sorted ascending, as a music21 chord does after add()
+                    elements[chord_index].notes.append(problem_note_object)
+                    elements[chord_index].notes.sort(key=ascending_key)
+                    # keep the destination hand's tie starts up to date so a revert can find the moved tie
+                    if destination_hand.contains(cur_measure_number, elements[chord_index]):
+                        destination_hand.add_tied_notes(cur_measure_number, elements[chord_index], [problem_note_object])
+
+            if len(elements) != 0:
+                # check possible chords and recolor accordingly
+                notes_to_check = list(elements[chord_index].notes)
+                if move_up:
+                    notes_to_check.reverse()
+                destination_possible = check_spacing(elements[chord_index].notes, constraints)
+                if not destination_possible:
+                    color_notes(elements[chord_index].notes, problem_chord_object.notes, COLOR_ERROR)
+                    overall_success = False
+                    new_errors += 1
+                else:
+                    color_notes(elements[chord_index].notes, problem_chord_object.notes, COLOR_CORRECT)
+
+            # return when all chords with tie have been flipped
+            # switch back if function created more errors for clarity
+            if problem_chord_object is start_chord:
+                if instrumentation is not None:
+                    instrumentation.count('switch_ties.measures_walked_back', measure_number - cur_measure_number)
+                if switch_back and new_errors >= old_errors:
+                    if instrumentation is not None:
+                        instrumentation.count('switch_ties.reverts')
+                    _ = switch_ties(problem_hand, destination_hand, tie_issue, measure_number, constraints, not move_up, switch_back=False, log=log)
+                    log(f'Reverting tied note {tie_issue} move')
+                return overall_success
+
+    return overall_success
+
+# find the best place to split a chord into two hands
+# assumes the best starting point is the gap between notes
+# returns: left_hand_notes, right_hand_notes
+def find_split_point(notes):
+    equal_ties = True
+
+    # split at the largest interval between notes
+    if(equal_ties):
+        greatest_interval = -1
+        split_index = -1
+        i = 0
+        while i < len(notes) - 1:
+            current_interval = notes[i + 1].midi - notes[i].midi
+            if current_interval >= greatest_interval:
+                greatest_interval = current_interval
+                split_index = i
+            i += 1
+
+    left_hand_notes = [notes[i] for i in range(0, split_index + 1)]
+    right_hand_notes = [notes[i] for i in range(split_index + 1, len(notes))]
+
+    return left_hand_notes, right_hand_notes
+
+# clears any rests out of a measure in both hands and copies the combined measure's rests into them
+# returns: void
+def prepare_measure(measure, right_hand, left_hand):
+    # clear out any existing rests because otherwise notes will be added on top of them, extending the measure
+    for rest in right_hand.rests(measure.number):
+        right_hand.remove(measure.number, rest)
+    for rest in left_hand.rests(measure.number):
+        left_hand.remove(measure.number, rest)
+
+    # handle the actual rests
+    for rest_object in measure.rests:
+        left_hand.insert(measure.number, EventRecord(rest_object.offset, rest_object.duration))
+        right_hand.insert(measure.number, EventRecord(rest_object.offset, rest_object.duration))
+
+# inserts the two halves of a split chord into the hands' measures, using a rest for an empty hand
+# returns: left_chord, right_chord
+def place_chord(measure_number, chord_object, left_hand_notes, right_hand_notes, right_hand, left_hand):
+    # copy notes to avoid reference issues
+    # notes from both hands are references to the same chord record which causes problems later
+    left_hand_notes = [note_object.copy() for note_object in left_hand_notes]
+    right_hand_notes = [note_object.copy() for note_object in right_hand_notes]
+    if instrumentation is not None:
+        instrumentation.count('place_chord.note_copies', len(left_hand_notes) + len(right_hand_notes))
+
+    # insert notes into respective measures
+    if left_hand_notes == []:
+        left_hand.insert(measure_number, EventRecord(chord_object.offset, chord_object.duration))
+        left_chord = EventRecord(chord_object.offset, chord_object.duration, [])
+    else:
+        left_chord = EventRecord(chord_object.offset, chord_object.duration, left_hand_notes)
+        left_hand.insert(measure_number, left_chord)
+    if right_hand_notes == []:
+        right_hand.insert(measure_number, EventRecord(chord_object.offset, chord_object.duration))
+        right_chord = EventRecord(chord_object.offset, chord_object.duration, [])
+    else:
+        right_chord = EventRecord(chord_object.offset, chord_object.duration, right_hand_notes)
+        right_hand.insert(measure_number, right_chord)
+
+    return left_chord, right_chord
+
+# splits every chord of the timeline between the hands, one chord at a time
+# impossible chords are repaired with adjust_chord, and with switch_ties when a tied note is in the way
+# chords that stay impossible are added to failures when a list is given
+# stop_at_first_failure returns as soon as one is found (the hands are then incomplete)
+# log is called with each message about a switched tie or an impossible chord (print on the command line)
+# returns: right_hand, left_hand, overall_success
+def split_timeline(timeline, constraints, failures=None, stop_at_first_failure=False, log=print):
+    overall_success = True
+
+    last_left_pitches = set()
+    last_right_pitches = set()
+
+    measure_numbers = [measure.number for measure in timeline]
+    right_hand = HandPart(measure_numbers)
+    left_hand = HandPart(measure_numbers)
+
+    # traverse by measures because Partstaffs need you to do that that
+    for measure in timeline:
+        measure_start = None if instrumentation is None else perf_counter()
+        prepare_measure(measure, right_hand, left_hand)
+
+        # assign notes to left and right parts
+        # single note chords (not really chords but whatever) are played by the right hand
+        splits = [find_split_point(chord_object.notes) for chord_object in measure.chords]
+
+        # check every split of every chord in the measure at once, each chord's adjust_chord gets its share
+        spacing = check_signatures_batch([hand for chord_object in measure.chords for hand in split_signatures(pitch_signature(chord_object.notes))], constraints)
+
+        hand_offset = 0
+        for chord_object, (left_hand_notes, right_hand_notes) in zip(measure.chords, splits):
+            hand_count = 2 * (len(chord_object.notes) + 1)
+            chord_spacing = spacing[hand_offset:hand_offset + hand_count]
+            hand_offset += hand_count
+
+            # make sure both hands can actually play the notes they have
+            left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue = adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints, chord_spacing)
+
+            left_chord, right_chord = place_chord(measure.number, chord_object, left_hand_notes, right_hand_notes, right_hand, left_hand)
+
+            if not success:
+                switch_start = None if instrumentation is None else perf_counter()
+                # checks if failure is due to a tied note being forced into one hand by seeing if the
+                # previous tied notes can be switched to the other hand to fix the issue
+                if left_tie_issue is not None:
+                    log(f'Switching tied note {left_tie_issue} from right hand to left hand - Measure: {measure.number} Offset: {chord_object.offset}')
+                    switched = switch_ties(left_hand, right_hand, left_tie_issue, measure.number, constraints, False, log=log)
+                    reason = 'tie'
+                elif right_tie_issue is not None:
+                    log(f'Switching tied note {right_tie_issue} from left hand to right hand - Measure: {measure.number} Offset: {chord_object.offset}')
+                    switched = switch_ties(right_hand, left_hand, right_tie_issue, measure.number, constraints, True, log=log)
+                    reason = 'tie'
+                else:
+                    switched = False
+                    reason = 'spacing'
+                    log(f'Impossible chord - Measure: {measure.number} Offset: {chord_object.offset}')
+                if instrumentation is not None and reason == 'tie':
+                    instrumentation.time('switch_ties', perf_counter() - switch_start)
+
+                if not switched:
+                    overall_success = False
+                    if failures is not None:
+                        failures.append(ChordFailure(measure.number, chord_object.offset, [str(note_object) for note_object in chord_object.notes], reason))
+                    if stop_at_first_failure:
+                        return right_hand, left_hand, overall_success
+
+            last_left_pitches = {pitch_key(note_object) for note_object in left_chord.notes}
+            last_right_pitches = {pitch_key(note_object) for note_object in right_chord.notes}
+
+        if instrumentation is not None:
+            instrumentation.time_measure(measure.number, perf_counter() - measure_start)
+
+    return right_hand, left_hand, overall_success
+
+# indices of the measures the timeline can be cut before without a tie crossing the cut
+# the first chord from such a measure on has no note continuing a tie, so its split does not depend on the chords before it
+# measures sharing a number share their hand measure, so such a timeline has no boundaries and is never cut
+# returns: [measure_index, ...]
+def tie_free_boundaries(timeline):
+    if len({measure.number for measure in timeline}) != len(timeline):
+        return []
+    boundaries = []
+    tie_free = True
+    for i in range(len(timeline) - 1, 0, -1):
+        if len(timeline[i].chords) > 0:
+            tie_free = all(note_object.tie != 'continue' and note_object.tie != 'stop' for note_object in timeline[i].chords[0].notes)
+        if tie_free:
+            boundaries.append(i)
+    boundaries.reverse()
+    return boundaries
+
+# cuts the timeline at tie free measures into at most segment_count segments with about as many chords each
+# returns: [[MeasureRecord, ...], ...]
+def segment_timeline(timeline, segment_count):
+    chord_count = sum(len(measure.chords) for measure in timeline)
+    segment_size = chord_count / max(segment_count, 1)
+
+    segments = []
+    start = 0
+    chords_before = 0
+    chords_so_far = 0
+    boundaries = set(tie_free_boundaries(timeline))
+    for i, measure in enumerate(timeline):
+        if i in boundaries and chords_so_far - chords_before >= segment_size and len(segments) < segment_count - 1:
+            segments.append(timeline[start:i])
+            start = i
+            chords_before = chords_so_far
+        chords_so_far += len(measure.chords)
+    segments.append(timeline[start:])
+    return segments
+
+# cuts the timeline at every tie free measure
+# returns: [[MeasureRecord, ...], ...]
+def tie_free_segments(timeline):
+    cuts = [0] + tie_free_boundaries(timeline) + [len(timeline)]
+    return [timeline[start:end] for start, end in zip(cuts, cuts[1:])]
+
+# split_timeline for one segment in a worker process, keeping its messages to be logged in order with the other segments'
+# returns: right_hand, left_hand, overall_success, failures, messages
+def split_segment(segment, constraints):
+    messages = []
+    failures = []
+    right_hand, left_hand, overall_success = split_timeline(segment, constraints, failures, log=messages.append)
+    return right_hand, left_hand, overall_success, failures, messages
+
+# stitches the split_segment results of a timeline's segments back together in order into new hands, logging their
+# messages and adding their impossible chords to failures, giving the same result as split_timeline on the whole timeline
+# switch_ties only looks back to the start of a tie, which is in the same segment unless a start could not be found,
+# and then the whole timeline is split again in order because the start may be in an earlier segment
+# returns: right_hand, left_hand, overall_success
+def stitch_segments(results, timeline, constraints, failures=None, log=print):
+    if any(right_hand.missing_tie_starts > 0 or left_hand.missing_tie_starts > 0 for right_hand, left_hand, _, _, _ in results):
+        return split_timeline(timeline, constraints, failures, log=log)
+
+    # new hands, so the results (which the split store may keep) are left as they were
+    right_hand = HandPart([])
+    left_hand = HandPart([])
+    overall_success = True
+    for segment_right_hand, segment_left_hand, segment_success, segment_failures, messages in results:
+        right_hand.extend(segment_right_hand)
+        left_hand.extend(segment_left_hand)
+        overall_success = overall_success and segment_success
+        for message in messages:
+            log(message)
+        if failures is not None:
+            failures.extend(segment_failures)
+    return right_hand, left_hand, overall_success
+
+# split_timeline with the timeline cut into segments at tie free measures that are split in parallel worker processes
+# and stitched back together (see stitch_segments)
+# returns: right_hand, left_hand, overall_success
+def split_timeline_parallel(timeline, constraints, failures=None, workers=None, log=print):
+    segments = segment_timeline(timeline, workers or cpu_count())
+    if len(segments) < 2:
+        return split_timeline(timeline, constraints, failures, log=log)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(split_segment, segments, [constraints] * len(segments)))
+    return stitch_segments(results, timeline, constraints, failures, log)
+
+# split_timeline one tie free segment at a time, handing over the hands of each segment in order
+# switch_ties never looks back past the start of its segment unless a tie start cannot be found in it, and then it
+# looks for it in the segments before, changing them too, so every segment is split before any is handed over, and
+# if a start is missing the whole timeline is split again in order instead
+# the split records are small next to the music21 objects they are written as, which only exist for the chunk
+# being written
+# the impossible chords are added to failures, so the piece can be played if failures is still empty at the end
+# returns: generator of (segment, right_hand, left_hand)
+def split_timeline_streamed(timeline, constraints, failures, log=print):
+    segments = tie_free_segments(timeline)
+    splits = deque()
+    for segment in segments:
+        split = split_segment(segment, constraints)
+        if split[0].missing_tie_starts > 0 or split[1].missing_tie_starts > 0:
+            right_hand, left_hand, _ = split_timeline(timeline, constraints, failures, log=log)
+            for segment in segments:
+                measure_numbers = [measure.number for measure in segment]
+                yield segment, right_hand.part_of(measure_numbers), left_hand.part_of(measure_numbers)
+            return
+        splits.append(split)
+
+    for segment in segments:
+        # handed over splits are dropped as soon as they are written
+        right_hand, left_hand, _, segment_failures, messages = splits.popleft()
+        for message in messages:
+            log(message)
+        failures.extend(segment_failures)
+        yield segment, right_hand, left_hand
+
+# fingerprint of the chords and rests of a measure
+# returns: hex digest
+def measure_fingerprint(measure):
+    return sha256(repr(pack_timeline([measure])).encode()).hexdigest()
+
+# splits of the segments of a timeline kept in a file between runs, so an edited score only has the segments
+# with a changed measure split again
+# a segment runs from one tie free measure to the next, so no tie and no hand state is carried into it
+# segments are stored under a hash of their measures' fingerprints and the constraints
+class SplitStore:
+    def __init__(self, file):
+        self.file = file
+        self.splits = {}
+        # segments reused and split again by the latest split_timeline_incremental
+        self.reused = 0
+        self.resplit = 0
+        try:
+            with open(file, 'rb') as f:
+                entry = pickle.load(f)
+            if entry['version'] == SPLIT_STORE_VERSION:
+                self.splits = entry['splits']
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # unreadable store (interrupted write or older format), start over
+            pass
+
+    # returns: key
+    def key(self, segment, constraints):
+        segment_hash = sha256(repr(constraints.fingerprint).encode())
+        for measure in segment:
+            segment_hash.update(measure_fingerprint(measure).encode())
+        return segment_hash.hexdigest()
+
+    # keeps only the given splits, the segments of the latest run, and writes them to the file
+    def save(self, splits):
+        self.splits = splits
+        # write to a temporary file first so an interrupted run never leaves half a store
+        temporary_path = f'{self.file}.{getpid()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump({'version': SPLIT_STORE_VERSION, 'splits': splits}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(temporary_path, self.file)
+
+# split_timeline that only splits the segments that are not in the store, and reuses the stored splits of the rest
+# the segments are stitched together like split_timeline_parallel's (see stitch_segments)
+# returns: right_hand, left_hand, overall_success
+def split_timeline_incremental(timeline, constraints, store, failures=None, log=print):
+    segments = tie_free_segments(timeline)
+    store.reused = 0
+    store.resplit = 0
+    results = []
+    splits = {}
+    for segment in segments:
+        key = store.key(segment, constraints)
+        result = store.splits.get(key)
+        if result is None:
+            result = split_segment(segment, constraints)
+            store.resplit += 1
+        else:
+            store.reused += 1
+        results.append(result)
+        splits[key] = result
+    store.save(splits)
+    return stitch_segments(results, timeline, constraints, failures, log)
+
+# creates the music21 note for a note record
+# returns: note
+def build_note(note_record):
+    from music21 import note, pitch, tie
+    note_object = note.Note(pitch.Pitch(step=note_record.step, octave=note_record.octave, accidental=note_record.accidental))
+    if note_record.cents:
+        note_object.pitch.microtone = note_record.cents
+    note_object.quarterLength = note_record.duration
+    if note_record.tie is not None:
+        note_object.tie = tie.Tie(note_record.tie)
+    note_object.style.color = COLOR_ERROR if note_record.error else COLOR_CORRECT
+    return note_object
+
+# fills a template part with the music21 chords and rests of a split hand
+# this is the only place the hands' notes become music21 objects
+# returns: void
+def build_hand_part(part, hand):
+    from music21 import chord, note
+    measure_index = MeasureIndex(part)
+    for measure_number, events in hand.measures.items():
+        # clear out the template's rests because otherwise notes will be added on top of them, extending the measure
+        for rest in measure_index.rests(measure_number):
+            measure_index.remove(measure_number, rest)
+
+        for event in events:
+            if event.is_rest():
+                element = note.Rest()
+            else:
+                element = chord.Chord([build_note(note_record) for note_record in event.notes])
+            element.quarterLength = event.duration
+            measure_index.insert(measure_number, event.offset, element)
+
+# main function to check if piece can be played by a piano
+# Traverses measure by measure/chord by chord, calling functions on the chords
+# Adds resulting chords to left- and right-hand parts
+# Also adds rests to prevent rhythm issues
+# splitter is greedy (split_timeline) or dp (split_timeline_dp)
+# with the greedy splitter, workers splits the timeline in segments on that many processes (see split_timeline_parallel)
+# and store only splits the segments that changed since the last run (see split_timeline_incremental)
+# returns: overall_success
+def check_playability(timeline, right_hand, left_hand, constraints, failures=None, splitter='greedy', workers=None, store=None, log=print):
+    if splitter == 'dp':
+        right_hand_records, left_hand_records, overall_success = split_timeline_dp(timeline, constraints, failures, log)
+    elif store is not None:
+        right_hand_records, left_hand_records, overall_success = split_timeline_incremental(timeline, constraints, store, failures, log)
+    elif workers is not None:
+        right_hand_records, left_hand_records, overall_success = split_timeline_parallel(timeline, constraints, failures, workers, log)
+    else:
+        right_hand_records, left_hand_records, overall_success = split_timeline(timeline, constraints, failures, log=log)
+    build_hand_part(right_hand, right_hand_records)
+    build_hand_part(left_hand, left_hand_records)
+
+    # fix tie weirdness (more details in function)
+    fix_ties_and_rests(left_hand)
+    fix_ties_and_rests(right_hand)
+    return overall_success
+
+# finds the notes of a chord that continue a tie from the previous chord
+# returns: [(previous_note_index, note_index), ...]
+def find_tie_links(previous_notes, notes):
+    previous_indices = {pitch_key(note_object): i for i, note_object in enumerate(previous_notes)}
+    links = []
+    for i, note_object in enumerate(notes):
+        if note_object.tie == 'continue' or note_object.tie == 'stop':
+            previous_index = previous_indices.get(pitch_key(note_object))
+            if previous_index is not None:
+                links.append((previous_index, i))
+    return links
+
+# counts the tie links that every pair of splits of two neighbouring chords would break
+# a link is broken when its notes end up in different hands, so with a table of how many links have both notes below
+# each pair of splits (a prefix sum over the links) every pair costs a few lookups instead of a pass over the links
+# returns: [[broken_ties for each split of the chord] for each split of the previous chord]
+def broken_tie_counts(links, previous_note_count, note_count):
+    below = [[0] * (note_count + 1) for _ in range(previous_note_count + 1)]
+    for previous_index, index in links:
+        below[previous_index + 1][index + 1] += 1
+    for previous_split in range(1, previous_note_count + 1):
+        for split_index in range(1, note_count + 1):
+            below[previous_split][split_index] += (below[previous_split - 1][split_index] + below[previous_split][split_index - 1]
+                                                   - below[previous_split - 1][split_index - 1])
+
+    # links with only the previous note below its split, plus links with only the note below its split
+    all_below = below[previous_note_count]
+    return [[row[note_count] + all_below[split_index] - 2 * row[split_index] for split_index in range(note_count + 1)] for row in below]
+
+# alternative to split_timeline that splits every chord in one global pass instead of repairing hands
+# chord by chord with adjust_chord and switch_ties
+# a chord with n notes has n + 1 candidate split indices (left hand = notes below the split)
+# a Viterbi pass picks one split per chord, first minimizing impossible chords and broken ties between
+# neighbouring chords, then the distance from the split find_split_point would have started from
+# runtime is O(chords x splits^2)
+# chords that stay impossible are added to failures when a list is given, and log is called with a message for each
+# returns: right_hand, left_hand, overall_success
+def split_timeline_dp(timeline, constraints, failures=None, log=print):
+    measure_numbers = [measure.number for measure in timeline]
+    right_hand = HandPart(measure_numbers)
+    left_hand = HandPart(measure_numbers)
+
+    # collect the chords of the whole piece in order
+    slots = []
+    for measure in timeline:
+        prepare_measure(measure, right_hand, left_hand)
+        for chord_object in measure.chords:
+            slots.append((measure.number, chord_object, chord_object.notes))
+
+    # check every candidate hand of every chord in one batch
+    hand_possible = check_signatures_batch([hand for _, _, notes in slots for hand in split_signatures(pitch_signature(notes))], constraints)
+
+    # a single failure always costs more than every split distance in the piece combined
+    failure_cost = sum(len(notes) + 1 for _, _, notes in slots) + 1
+
+    costs = []
+    back_pointers = []
+    hand_offset = 0
+    previous_notes = []
+    for measure_number, chord_object, notes in slots:
+        greedy_split = len(find_split_point(notes)[0])
+        broken_ties = broken_tie_counts(find_tie_links(previous_notes, notes), len(previous_notes), len(notes))
+
+        chord_costs = []
+        chord_back_pointers = []
+        for split_index in range(len(notes) + 1):
+            spacing_ok = hand_possible[hand_offset + split_index] and hand_possible[hand_offset + len(notes) + 1 + split_index]
+            node_cost = (0 if spacing_ok else failure_cost) + abs(split_index - greedy_split)
+
+            # best previous split, treating ties that would change hands as failures
+            best_cost = 0
+            best_previous = None
+            if len(costs) > 0:
+                for previous_split, previous_cost in enumerate(costs[-1]):
+                    cost = previous_cost + broken_ties[previous_split][split_index] * failure_cost
+                    if best_previous is None or cost < best_cost:
+                        best_cost = cost
+                        best_previous = previous_split
+
+            chord_costs.append(best_cost + node_cost)
+            chord_back_pointers.append(best_previous)
+
+        costs.append(chord_costs)
+        back_pointers.append(chord_back_pointers)
+        hand_offset += 2 * (len(notes) + 1)
+        previous_notes = notes
+
+    # trace the cheapest path back from the last chord
+    chosen_splits = [0] * len(slots)
+    if len(slots) > 0:
+        split_index = min(range(len(costs[-1])), key=lambda i: costs[-1][i])
+        for t in range(len(slots) - 1, -1, -1):
+            chosen_splits[t] = split_index
+            split_index = back_pointers[t][split_index]
+
+    # build the hand parts from the chosen splits
+    overall_success = True
+    hand_offset = 0
+    previous_notes = []
+    previous_split = 0
+    for (measure_number, chord_object, notes), split_index in zip(slots, chosen_splits):
+        spacing_ok = hand_possible[hand_offset + split_index] and hand_possible[hand_offset + len(notes) + 1 + split_index]
+        ties_ok = all((previous_index < previous_split) == (index < split_index) for previous_index, index in find_tie_links(previous_notes, notes))
+        left_hand_notes = notes[:split_index][::-1]
+        right_hand_notes = notes[split_index:]
+
+        if spacing_ok and ties_ok:
+            color_notes(left_hand_notes, right_hand_notes, COLOR_CORRECT)
+        else:
+            color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
+            overall_success = False
+            if not spacing_ok:
+                log(f'Impossible chord - Measure: {measure_number} Offset: {chord_object.offset}')
+            else:
+                log(f'Impossible tie between hands - Measure: {measure_number} Offset: {chord_object.offset}')
+            if failures is not None:
+                failures.append(ChordFailure(measure_number, chord_object.offset, [str(note_object) for note_object in notes], 'spacing' if not spacing_ok else 'tie'))
+
+        place_chord(measure_number, chord_object, left_hand_notes, right_hand_notes, right_hand, left_hand)
+
+        hand_offset += 2 * (len(notes) + 1)
+        previous_notes = notes
+        previous_split = split_index
+
+    return right_hand, left_hand, overall_success
+
+# splits the timeline only to find the impossible chords, without templating hand parts or writing a score
+# the dp splitter always looks at the whole piece, and a store (greedy splitter only) reuses the splits of unchanged segments,
+# so for them stop_at_first_failure only trims the report
+# returns: overall_success, [ChordFailure, ...]
+def validate_timeline(timeline, constraints, splitter='greedy', stop_at_first_failure=False, store=None, log=print):
+    failures = []
+    if splitter == 'dp' or store is not None:
+        if splitter == 'dp':
+            _, _, overall_success = split_timeline_dp(timeline, constraints, failures, log)
+        else:
+            _, _, overall_success = split_timeline_incremental(timeline, constraints, store, failures, log)
+        if stop_at_first_failure:
+            del failures[1:]
+    else:
+        _, _, overall_success = split_timeline(timeline, constraints, failures, stop_at_first_failure, log)
+    return overall_success, failures
+
+# writes the result of validate_timeline as json
+# returns: void
+def write_report(file, score, overall_success, failures):
+    with open(file, 'w') as f:
+        json.dump({'score': score, 'playable': overall_success, 'failures': [failure.as_dict() for failure in failures]}, f, indent=2)
+
+# this function combines tied notes and rests where possible to make the resulting music easier to read
+# the .chordify() function combines all notes into chords in a single partstaff object
+# this creates ties anywhere two notes with different lengths are played at the same time
+# when splitting the chords into two hands, many unnecessary ties are left over
+def fix_ties_and_rests(part):
+    from music21 import chord, note, stream
+    for measure in part.getElementsByClass(stream.Measure):
+        removals = []
+
+        # merge tied notes where possible
+        # dont merge unless all notes are tied from the previous chord, and all of the previous chord's notes are tied to the current chord
+        chords = list(measure.getElementsByClass(chord.Chord))
+        head = 0
+        for i in range(1, len(chords)):
+            if ties_forward(chords[i - 1]) and ties_backward(chords[i]):
+                removals.append(chords[i])
+            else:
+                merge_run(chords, head, i)
+                head = i
+        merge_run(chords, head, len(chords))
+
+        # simpler version for rests
+        rests = list(measure.getElementsByClass(note.Rest))
+        ends = [measure.elementOffset(rest) + rest.quarterLength for rest in rests]
+        head = 0
+        for i in range(1, len(rests)):
+            if ends[i - 1] == measure.elementOffset(rests[i]):
+                removals.append(rests[i])
+            else:
+                merge_run(rests, head, i)
+                head = i
+        merge_run(rests, head, len(rests))
+
+        # remove everything that was merged in one go
+        if removals:
+            measure.remove(removals)
+
+# checks if every note of a chord is tied into the next chord
+# returns: ties_forward
+def ties_forward(chord_object):
+    for note_object in chord_object.notes:
+        if note_object.style.color == COLOR_ERROR or note_object.tie is None or note_object.tie.type == 'stop':
+            return False
+    return True
+
+# checks if every note of a chord is tied from the previous chord
+# returns: ties_backward
+def ties_backward(chord_object):
+    for note_object in chord_object.notes:
+        if note_object.style.color == COLOR_ERROR or note_object.tie is None or note_object.tie.type == 'start':
+            return False
+    return True
+
+# extends the first element of a run by the lengths of the rest of the run
+# returns: void
+def merge_run(elements, start, end):
+    if end - start > 1:
+        elements[start].quarterLength = sum(element.quarterLength for element in elements[start:end])
+
+# reads finger_constraint file and creates list of constraints
+# returns: [[finger1, finger2, max_distance, max_can_be_different_colors], [...], ...]
+def create_constraints(file):
+    constraints = []
+    finger_map = {
+        'thumb': 0,
+        'index': 1,
+        'middle': 2,
+        'ring': 3,
+        'pinky': 4
+    }
+    with open(file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            parts = line.split(',')
+
+            finger1 = finger_map[parts[0].strip().strip('\'')]
+            finger2 = finger_map[parts[1].strip().strip('\'')]
+
+            max_distance = int(parts[2].split('=')[1].strip())
+            max_can_be_different_colors = parts[3].split('=')[1].strip()
+            max_can_be_different_colors = True if max_can_be_different_colors == 'True' else False
+
+            constraints.append([finger1, finger2, max_distance, max_can_be_different_colors])
+
+    return constraints
+        
+
+# points music21 at the local musicxml reader
+# returns: void
+def configure_environment():
+    from music21 import environment
+    if platform == 'win32':
+        # Windows
+        path = 'C:/Program Files/MuseScore 4/bin/Musescore4.exe' # (TODO?: not hardcode the musicxml reader path?)
+    elif platform == 'darwin':
+        # Mac OS - TODO
+        pass
+    else:
+        # assume Linux
+        path = '/usr/bin/musescore'
+    env = environment.Environment()
+    env['musicxmlPath'] = path
+
+# everything the program needs from a score once it has been parsed: the chords of the timeline, an empty
+# template of the measures to build each hand in, and the dynamics and metadata copied to the output
+# make_hand_template returns a new template part every time it is called, load_metadata returns the metadata
+# both are only called when the output score is built, so checking a cached score never needs music21
+class ExtractedScore:
+    def __init__(self, part_count, timeline, make_hand_template, dynamics, load_metadata):
+        self.part_count = part_count
+        self.timeline = timeline
+        self.make_hand_template = make_hand_template
+        self.dynamics = dynamics
+        self.load_metadata = load_metadata
+
+# reads the dynamics of the first part
+# returns: [(measure_number, offset, value), ...]
+def score_dynamics(song):
+    from music21 import dynamics, stream
+    found = []
+    for measure in song.parts[0].getElementsByClass(stream.Measure):
+        for dynamic in measure.getElementsByClass(dynamics.Dynamic):
+            found.append((measure.number, dynamic.offset, dynamic.value))
+    return found
+
+# parses a score and extracts its timeline
+# the stream extractor only reads the timeline (enough to validate the score), and falls back to the sweep extractor for
+# scores it cannot read
+# returns: ExtractedScore
+def extract_score(score, extractor='sweep'):
+    if extractor == 'stream':
+        streamed = stream_timeline(score)
+        if streamed is not None:
+            part_count, timeline = streamed
+            return ExtractedScore(part_count, timeline, None, [], None)
+        extractor = 'sweep'
+
+    from music21 import converter
+    song = converter.parse(score)
+    if extractor == 'chordify':
+        # combine all parts into one PartStaff
+        combined = song.chordify()
+        timeline = extract_timeline(combined)
+        make_hand_template = combined.template
+    else:
+        # slice all parts straight into chords without building the combined PartStaff
+        sounding = sounding_score(song)
+        timeline = sweep_timeline(sounding)
+        make_hand_template = lambda: hand_template(sounding)
+    return ExtractedScore(len(song.parts), timeline, make_hand_template, score_dynamics(song), lambda: song.metadata)
+
+# converts a timeline to plain tuples for the timeline cache
+# returns: [(number, [(offset, duration), ...], [(offset, duration, [(name, step, octave, accidental, midi, alter, ps, cents, tie), ...]), ...]), ...]
+def pack_timeline(timeline):
+    return [(measure.number,
+             [(rest.offset, rest.duration) for rest in measure.rests],
+             [(chord_object.offset, chord_object.duration,
+               [(n.name, n.step, n.octave, n.accidental, n.midi, n.alter, n.ps, n.cents, n.tie) for n in chord_object.notes])
+              for chord_object in measure.chords])
+            for measure in timeline]
+
+# returns: [MeasureRecord, ...]
+def unpack_timeline(packed):
+    timeline = []
+    for number, rests, chords in packed:
+        chord_records = []
+        for offset, duration, notes in chords:
+            chord_records.append(EventRecord(offset, duration, [NoteRecord(*n, duration, offset) for n in notes]))
+        timeline.append(MeasureRecord(number, [EventRecord(offset, duration) for offset, duration in rests], chord_records))
+    return timeline
+
+# on-disk cache of extracted scores, so a score that was already read is not parsed again
+# entries are keyed by a hash of the score file's contents, the cache version and the music21 version
+# the least recently used entries (by file modification time) are removed once the cache is over max_size bytes
+class TimelineCache:
+    def __init__(self, directory=TIMELINE_CACHE_DIRECTORY, max_size=TIMELINE_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    # returns: key
+    def key(self, score):
+        content_hash = sha256()
+        content_hash.update(f'{TIMELINE_CACHE_VERSION} {version("music21")}\n'.encode())
+        with open(score, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    # returns: ExtractedScore, or None if the score is not in the cache
+    def get(self, key):
+        path = join(self.directory, key + '.pickle')
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # unreadable entry (interrupted write or older format), drop it unless another process already has
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        # another process may evict the entry after it was read, the loaded copy is still good
+        try:
+            utime(path)
+        except FileNotFoundError:
+            pass
+
+        template = entry['template']
+        def make_hand_template():
+            from music21 import freezeThaw
+            thawer = freezeThaw.StreamThawer()
+            thawer.openStr(template)
+            return thawer.stream
+        return ExtractedScore(entry['part_count'], unpack_timeline(entry['timeline']), make_hand_template,
+                              entry['dynamics'], lambda: pickle.loads(entry['metadata']))
+
+    def put(self, key, extracted):
+        from music21 import freezeThaw
+        makedirs(self.directory, exist_ok=True)
+        entry = {
+            'part_count': extracted.part_count,
+            'timeline': pack_timeline(extracted.timeline),
+            'template': freezeThaw.StreamFreezer(extracted.make_hand_template()).writeStr(fmt='pickle'),
+            'dynamics': extracted.dynamics,
+            'metadata': pickle.dumps(extracted.load_metadata(), protocol=pickle.HIGHEST_PROTOCOL)
+        }
+        # write to a temporary file first so other processes never read half an entry
+        path = join(self.directory, key + '.pickle')
+        temporary_path = f'{path}.{getpid()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(temporary_path, path)
+        self.evict()
+
+    # removes the least recently used entries until the cache fits in max_size
+    def evict(self):
+        entries = []
+        for name in listdir(self.directory):
+            if name.endswith('.pickle'):
+                try:
+                    info = stat(join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                remove(join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        if isdir(self.directory):
+            for name in listdir(self.directory):
+                if name.endswith('.pickle'):
+                    remove(join(self.directory, name))
+
+# extract_score through the timeline cache when there is one (sweep extractor only)
+# returns: extracted, cached
+def read_score(score, extractor='sweep', cache=None):
+    if cache is None or extractor != 'sweep':
+        return extract_score(score, extractor), False
+    key = cache.key(score)
+    extracted = cache.get(key)
+    if extracted is not None:
+        return extracted, True
+    extracted = extract_score(score, extractor)
+    cache.put(key, extracted)
+    return extracted, False
+
+# puts both hands into a two staff piano score with the original's dynamics and metadata
+# returns: score
+def build_piano_score(extracted, right_hand, left_hand):
+    from music21 import clef, stream
+    # set clefs for left hand
+    left_hand.getElementsByClass(stream.Measure)[0].removeByClass(clef.Clef)
+    left_hand.getElementsByClass(stream.Measure)[0].insert(0, clef.BassClef())
+
+    return assemble_piano_score(right_hand, left_hand, extracted.dynamics, extracted.load_metadata())
+
+# puts both hands into a two staff piano score with the given dynamics, and with the metadata unless it is None
+# returns: score
+def assemble_piano_score(right_hand, left_hand, dynamic_marks, score_metadata):
+    from music21 import dynamics, instrument, layout, metadata, stream
+    # create empty final score
+    final = stream.Score()
+
+    # create piano staff grouping
+    piano_staff = layout.StaffGroup([right_hand, left_hand], name='Piano', symbol='brace')
+
+    # set instruments for both hands
+    instruments_right = [inst for inst in right_hand.recurse().getElementsByClass(instrument.Instrument)]
+    instruments_left = [inst for inst in left_hand.recurse().getElementsByClass(instrument.Instrument)]
+    for inst in instruments_right + instruments_left:
+        inst.activeSite.remove(inst)
+
+    right_hand.insert(0, instrument.Piano())
+    left_hand.insert(0, instrument.Piano())
+
+    # insert dynamics
+    right_index = MeasureIndex(right_hand)
+    for measure_number, offset, value in dynamic_marks:
+        new_dynamic = dynamics.Dynamic()
+        new_dynamic.value = value
+        right_index.insert(measure_number, offset, new_dynamic)
+
+    # assemble final score
+    final.insert(0, piano_staff)
+    final.append(right_hand)
+    final.append(left_hand)
+
+    # set metadata
+    if score_metadata is not None:
+        final.insert(0, metadata.Metadata())
+        final.metadata = score_metadata
+    final.parts[0].partName = 'Pno'
+    final.parts[1].partName = 'Pno'
+    return final
+
+# an element of an exported score as ElementTree writes it, without its tail (the whitespace after it)
+# returns: text
+def element_text(element):
+    tail = element.tail
+    element.tail = None
+    text = tostring(element, encoding='unicode')
+    element.tail = tail
+    return text
+
+# the opening tag of an element as ElementTree writes it
+# returns: text
+def opening_tag(element):
+    return tostring(Element(element.tag, element.attrib), encoding='unicode', short_empty_elements=False)[:-len(f'</{element.tag}>')]
+
+# the children of an element of an exported score, each with the text before it in the output: the whitespace and the
+# comments music21 puts before every part and measure
+# returns: [(prefix, child), ...], text after the last child
+def prefixed_children(element):
+    children = []
+    prefix = element.text or ''
+    for child in element:
+        if child.tag is Comment:
+            prefix += element_text(child) + (child.tail or '')
+        else:
+            children.append((prefix, child))
+            prefix = child.tail or ''
+    return children, prefix
+
+# exports a score to musicxml like music21's write does, but as the element tree of every part and measure, so that
+# the measures of several exports can be written one after the other
+# the tree is indented and its attributes sorted the way music21 does before writing it, and joining the head, each
+# part's opening, measures and end, and the tail gives the file write would
+# returns: head, [(part_tag, [(prefix, measure), ...], part_end), ...], tail
+def export_musicxml_parts(score):
+    from music21.musicxml.helpers import indent
+    from music21.musicxml.m21ToXml import GeneralObjectExporter, ScoreExporter
+    exporter = ScoreExporter(GeneralObjectExporter().fromGeneralObject(score))
+    root = exporter.parse()
+    indent(root)
+    for element in root.iter():
+        if len(element.attrib) > 1:
+            attributes = sorted(element.attrib.items())
+            element.attrib.clear()
+            element.attrib.update(attributes)
+
+    children, closing = prefixed_children(root)
+    head = [opening_tag(root)]
+    parts = []
+    for prefix, child in children:
+        if child.tag == 'part':
+            measures, part_closing = prefixed_children(child)
+            parts.append(((prefix + opening_tag(child)).encode(), measures, (part_closing + f'</{child.tag}>').encode()))
+        else:
+            # the part list and everything else before the parts
+            head.append(prefix + element_text(child))
+    return exporter.xmlHeader() + ''.join(head).encode(), parts, (closing + f'</{root.tag}>').encode()
+
+# the text of some measures of an exported part
+# returns: text
+def measures_text(measures):
+    return ''.join(prefix + element_text(measure) for prefix, measure in measures).encode()
+
+# checks if a beam group is still open at the end of some measures of an exported part
+# music21 goes on adding the notes after such a group to it until a beam ends, and turns all of their stems the same way
+# returns: beam_group_open
+def beam_group_open(measures):
+    group_open = False
+    for _, measure in measures:
+        for beam in measure.iter('beam'):
+            if beam.get('number') == '1' and beam.text in ('begin', 'end'):
+                group_open = beam.text == 'begin'
+    return group_open
+
+# writes the piano score like build_piano_score and write do, but a chunk of measures at a time, so only the chunk
+# being written is held as music21 objects instead of both hands of the whole score
+# each chunk is exported after a copy of the last measure of the chunk before it, which is left out of the output
+# but carries the accidentals, clef, key and time signature over the barline to the exporter
+# a chunk that ends in the middle of a beam group waits to be exported again with the next one, which ends the group
+# musicxml lists all measures of a part before the next part, so the measures of the right hand go straight to the
+# output file while those of the left hand wait in a temporary file until close
+class StreamedScoreWriter:
+    def __init__(self, extracted, output):
+        from music21 import stream
+        self.extracted = extracted
+        self.output = output
+        # the templates of both hands are emptied, and each of their measures is dropped once it has been written
+        # spanners over measures (such as repeat brackets) are added to every chunk they cover until their last measure
+        self.templates = []
+        self.template_measures = []
+        self.template_spanners = []
+        for template in (extracted.make_hand_template(), extracted.make_hand_template()):
+            measures = list(template.getElementsByClass(stream.Measure))
+            indices = {id(measure): i for i, measure in enumerate(measures)}
+            spanners = []
+            for spanner in template.spanners:
+                spanned = [indices[id(element)] for element in spanner.getSpannedElements() if id(element) in indices]
+                if spanned:
+                    spanners.append((min(spanned), max(spanned), spanner))
+            self.template_measures.append(deque((measure.offset, measure) for measure in measures))
+            template.remove(measures + [spanner for _, _, spanner in spanners])
+            self.templates.append(template)
+            self.template_spanners.append(spanners)
+        self.dynamics = {}
+        for measure_number, offset, value in extracted.dynamics:
+            self.dynamics.setdefault(measure_number, []).append((measure_number, offset, value))
+
+        self.measures_written = 0
+        # filled measures of both hands that have not been written yet, as (offset, measure)
+        self.pending = ([], [])
+        # context measures of both hands and their offset, once the first chunk is written
+        self.contexts = None
+        self.in_effect = ({}, {})
+        self.part_tags = []
+        self.part_ends = []
+        self.spools = []
+        self.overflow = []
+        self.tail = b''
+
+    # fills the measures of some segments with their split hands, and writes them with the measures still waiting
+    # unless a beam group is left open at the end (or this is the last chunk)
+    # returns: void
+    def write(self, chunk, last=False):
+        from music21 import clef
+        records = (HandPart([]), HandPart([]))
+        for _, right_hand, left_hand in chunk:
+            records[0].extend(right_hand)
+            records[1].extend(left_hand)
+
+        # fill the chunk's template measures like check_playability does for the whole score
+        measure_count = sum(len(segment) for segment, _, _ in chunk)
+        starts_score = self.measures_written == 0 and not self.pending[0]
+        for template, template_measures, hand_records, pending in zip(self.templates, self.template_measures, records, self.pending):
+            hand = template.cloneEmpty(derivationMethod='template')
+            measures = [template_measures.popleft() for _ in range(measure_count)]
+            for offset, measure in measures:
+                hand.coreInsert(offset, measure)
+            hand.coreElementsChanged()
+            build_hand_part(hand, hand_records)
+            fix_ties_and_rests(hand)
+            pending.extend(measures)
+        if starts_score:
+            self.pending[1][0][1].removeByClass(clef.Clef)
+            self.pending[1][0][1].insert(0, clef.BassClef())
+
+        # put the context measure and the waiting measures in new parts
+        pending_end = self.measures_written + len(self.pending[0])
+        origin = self.pending[0][0][0] if self.contexts is None else self.contexts[2]
+        hands = []
+        for i, (template, template_spanners, pending) in enumerate(zip(self.templates, self.template_spanners, self.pending)):
+            hand = template.cloneEmpty(derivationMethod='template')
+            for first_index, _, spanner in template_spanners:
+                if first_index < pending_end:
+                    hand.insert(0, spanner)
+            if self.contexts is not None:
+                hand.insert(0, self.contexts[i])
+            for offset, measure in pending:
+                hand.coreInsert(offset - origin, measure)
+            hand.coreElementsChanged()
+            hands.append(hand)
+        new_measures = self.pending[0][len(self.pending[0]) - measure_count:]
+        dynamic_marks = [mark for _, measure in new_measures for mark in self.dynamics.get(measure.number, [])]
+        score = assemble_piano_score(hands[0], hands[1], dynamic_marks, self.extracted.load_metadata() if self.contexts is None else None)
+
+        head, parts, self.tail = export_musicxml_parts(score)
+        start = 0 if self.contexts is None else 1
+        end = start + len(self.pending[0])
+        if not last and any(beam_group_open(part_measures[:end]) for _, part_measures, _ in parts):
+            return
+
+        # leave out the context measure, and hold back the measures music21 adds after the chunk for notes running past
+        # its last barline, those notes go into the next chunk's first measure unless this is the last chunk
+        self.overflow = []
+        for i, (part_tag, part_measures, part_end) in enumerate(parts):
+            if self.contexts is None:
+                self.part_tags.append(part_tag)
+                self.part_ends.append(part_end)
+                if i == 0:
+                    self.output.write(head + part_tag)
+                else:
+                    self.spools.append(TemporaryFile())
+            (self.output if i == 0 else self.spools[i - 1]).write(measures_text(part_measures[start:end]))
+            self.overflow.append(measures_text(part_measures[end:]))
+
+        contexts = [self.context_measure([measure for _, measure in pending], in_effect) for pending, in_effect in zip(self.pending, self.in_effect)]
+        self.contexts = (contexts[0], contexts[1], self.pending[0][-1][0])
+        self.measures_written = pending_end
+        for template_spanners in self.template_spanners:
+            template_spanners[:] = [spanner for spanner in template_spanners if spanner[1] >= pending_end]
+        self.pending = ([], [])
+
+    # copy of the last of some measures of a hand, given the clef, key and time signature in effect where it has none of
+    # its own, in_effect is kept up to date with the measures
+    # returns: measure
+    def context_measure(self, measures, in_effect):
+        from music21 import clef, key, meter
+        for measure in measures:
+            for kind in (clef.Clef, key.KeySignature, meter.TimeSignature):
+                found = measure.getElementsByClass(kind)
+                if found:
+                    in_effect[kind] = found.last()
+        context = deepcopy(measures[-1])
+        for kind, element in in_effect.items():
+            if not context.getElementsByClass(kind):
+                context.insert(0, deepcopy(element))
+        return context
+
+    # writes the measures still waiting, finishes the right hand's part and appends the left hand's
+    # returns: void
+    def close(self):
+        if self.pending[0]:
+            self.write([], True)
+        self.output.write(self.overflow[0] + self.part_ends[0])
+        for part_tag, spool, overflow, part_end in zip(self.part_tags[1:], self.spools, self.overflow[1:], self.part_ends[1:]):
+            self.output.write(part_tag)
+            spool.seek(0)
+            copyfileobj(spool, self.output)
+            spool.close()
+            self.output.write(overflow + part_end)
+        self.output.write(self.tail)
+
+# splits the timeline and writes the piano score a segment at a time with a StreamedScoreWriter, in chunks of at least
+# STREAMED_CHUNK_MEASURES measures
+# returns: overall_success
+def write_piano_score_streamed(extracted, constraints, output_file, failures=None, log=print):
+    failures = [] if failures is None else failures
+    with open(output_file, 'wb') as output:
+        writer = StreamedScoreWriter(extracted, output)
+        chunk = []
+        for segment, right_hand, left_hand in split_timeline_streamed(extracted.timeline, constraints, failures, log):
+            chunk.append((segment, right_hand, left_hand))
+            if sum(len(chunk_segment) for chunk_segment, _, _ in chunk) >= STREAMED_CHUNK_MEASURES:
+                writer.write(chunk)
+                chunk = []
+        if chunk:
+            writer.write(chunk)
+        writer.close()
+    return len(failures) == 0
+
+# runs the whole program on one score: parse, extract the chords, split them and write the result
+# with check_only only the impossible chords are found and written to output.json
+# with a cache, a score that was already extracted is loaded from it instead of being parsed (sweep extractor only)
+# with a split store, only the segments that changed since the last run are split (greedy splitter only)
+# with stream_output the piano score is split and written a few measures at a time (greedy splitter only), and the
+# peak memory of the process is added to the summary
+# log is called with each progress message (print on the command line)
+# returns: {'score': ..., 'output': ..., 'playable': ..., 'failures': [...], 'cached': ..., 'seconds': {stage: seconds, ...}}
+def process_score(score, output, constraints, splitter='greedy', extractor='sweep', check_only=False, stop_at_first_failure=False,
+                  split_workers=None, cache=None, store=None, stream_output=False, log=print):
+    seconds = {}
+    start = perf_counter()
+
+    # the stream extractor does not read what the piano score is built from
+    if extractor == 'stream' and not check_only:
+        extractor = 'sweep'
+    extracted, cached = read_score(score, extractor, cache)
+    log(f'\nStarting at {extracted.part_count} parts...\n')
+    seconds['read'] = perf_counter() - start
+    timeline = extracted.timeline
+
+    stage_start = perf_counter()
+    if check_only:
+        # only split the chords, the piano score is never built
+        success, failures = validate_timeline(timeline, constraints, splitter, stop_at_first_failure, store, log)
+        seconds['split'] = perf_counter() - stage_start
+        output_file = output + '.json'
+        stage_start = perf_counter()
+        write_report(output_file, score, success, failures)
+    elif stream_output:
+        # splitting and writing take turns, so both are timed as the write
+        failures = []
+        output_file = output + '.musicxml'
+        success = write_piano_score_streamed(extracted, constraints, output_file, failures, log)
+    else:
+        # create empty parts for right and left hand
+        right_hand = extracted.make_hand_template()
+        left_hand = extracted.make_hand_template()
+
+        # main function
+        failures = []
+        success = check_playability(timeline, right_hand, left_hand, constraints, failures, splitter, split_workers, store, log)
+        seconds['split'] = perf_counter() - stage_start
+
+        # write output file
+        output_file = output + '.musicxml'
+        stage_start = perf_counter()
+        build_piano_score(extracted, right_hand, left_hand).write('musicxml', output_file)
+    seconds['write'] = perf_counter() - stage_start
+    seconds['total'] = perf_counter() - start
+
+    summary = {'score': score, 'output': output_file, 'playable': success, 'cached': cached,
+               'failures': [failure.as_dict() for failure in failures], 'seconds': seconds}
+    if store is not None:
+        summary['segments'] = {'reused': store.reused, 'split': store.resplit}
+    if stream_output:
+        summary['peak_memory'] = peak_memory()
+    return summary
+
+# peak resident memory of this process so far in MB, or None where it cannot be read (Windows)
+# returns: megabytes
+def peak_memory():
+    try:
+        from resource import getrusage, RUSAGE_SELF
+    except ImportError:
+        return None
+    # bytes on Mac OS, kilobytes on Linux
+    return getrusage(RUSAGE_SELF).ru_maxrss / (1024 * 1024 if platform == 'darwin' else 1024)
+
+# result of validate: whether a score can be played and where it cannot
+class Result:
+    __slots__ = ('score', 'playable', 'failures', 'part_count', 'cached', 'seconds')
+
+    def __init__(self, score, playable, failures, part_count, cached, seconds):
+        self.score = score
+        self.playable = playable
+        self.failures = failures
+        self.part_count = part_count
+        self.cached = cached
+        self.seconds = seconds
+
+    # returns: {'score': ..., 'playable': ..., 'failures': [...], 'part_count': ..., 'cached': ..., 'seconds': {...}}
+    def as_dict(self):
+        return {'score': self.score, 'playable': self.playable, 'failures': [failure.as_dict() for failure in self.failures],
+                'part_count': self.part_count, 'cached': self.cached, 'seconds': self.seconds}
+
+# turns the constraints given to validate into compiled constraints
+# constraints can be None (no constraints), a finger constraint file, the list create_constraints returns or already compiled
+# returns: CompiledConstraints
+def load_constraints(constraints):
+    if constraints is None:
+        return compile_constraints([])
+    if isinstance(constraints, CompiledConstraints):
+        return constraints
+    if isinstance(constraints, str):
+        return compile_constraints(create_constraints(constraints))
+    return compile_constraints(constraints)
+
+# log for the library entry points and worker processes, which drop the messages the command line prints
+# returns: void
+def discard_message(message):
+    pass
+
+# library entry point: checks whether a score can be played on the piano without building or writing a piano score
+# nothing is printed, the messages go to discard_message and sys.stdout is left alone, so threads can call it at once
+# music21 is only imported if the score has to be parsed (never with the stream extractor, unless the score has chord symbols)
+# returns: Result
+def validate(score, constraints=None, splitter='greedy', stop_at_first_failure=False, cache=None, store=None, extractor='sweep'):
+    constraints = load_constraints(constraints)
+    start = perf_counter()
+    extracted, cached = read_score(score, extractor, cache)
+    read_seconds = perf_counter() - start
+    success, failures = validate_timeline(extracted.timeline, constraints, splitter, stop_at_first_failure, store, discard_message)
+    seconds = {'read': read_seconds, 'split': perf_counter() - start - read_seconds, 'total': perf_counter() - start}
+    return Result(score, success, failures, extracted.part_count, cached, seconds)
+
+# timeline shared by the calls to validate_profile in a profile worker process
+profile_timeline = None
+
+# sets up a profile worker process once with the timeline every profile is checked against
+# returns: void
+def init_profile_worker(timeline):
+    global profile_timeline
+    profile_timeline = timeline
+
+# validate_timeline for one profile in a profile worker process, without the splitter's messages
+# returns: overall_success, [ChordFailure, ...], seconds
+def validate_profile(constraints, splitter, stop_at_first_failure):
+    start = perf_counter()
+    overall_success, failures = validate_timeline(profile_timeline, constraints, splitter, stop_at_first_failure, log=discard_message)
+    return overall_success, failures, perf_counter() - start
+
+# checks one timeline against several finger constraint profiles (for example one for each hand size)
+# every profile is split on its own, with its own adjust_chord and switch_ties state, but the score is only read once
+# with workers the profiles are spread over that many processes
+# returns: [(overall_success, [ChordFailure, ...], seconds), ...] in profile order
+def validate_profiles(timeline, profiles, splitter='greedy', stop_at_first_failure=False, workers=None):
+    if workers is None or workers < 2 or len(profiles) < 2:
+        init_profile_worker(timeline)
+        return [validate_profile(constraints, splitter, stop_at_first_failure) for constraints in profiles]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_profile_worker, initargs=(timeline,)) as executor:
+        return list(executor.map(validate_profile, profiles, [splitter] * len(profiles), [stop_at_first_failure] * len(profiles)))
+
+# reads a score once and validates it against every constraint file, writing the profile x impossible chord matrix to output.json
+# returns: {'score': ..., 'output': ..., 'profiles': [...], 'locations': [...], 'seconds': {...}}
+def process_profiles(score, output, constraint_files, splitter='greedy', extractor='sweep', stop_at_first_failure=False,
+                     cache=None, workers=None):
+    seconds = {}
+    start = perf_counter()
+    extracted, cached = read_score(score, extractor, cache)
+    seconds['read'] = perf_counter() - start
+
+    stage_start = perf_counter()
+    profiles = [compile_constraints(create_constraints(file)) for file in constraint_files]
+    results = validate_profiles(extracted.timeline, profiles, splitter, stop_at_first_failure, workers)
+    seconds['split'] = perf_counter() - stage_start
+
+    profile_results = []
+    failing_profiles = {}
+    for file, (overall_success, failures, profile_seconds) in zip(constraint_files, results):
+        profile_results.append({
+            'constraints': file,
+            'playable': overall_success,
+            'impossible_chords': len(failures),
+            'spacing': sum(1 for failure in failures if failure.reason == 'spacing'),
+            'tie': sum(1 for failure in failures if failure.reason == 'tie'),
+            'failures': [failure.as_dict() for failure in failures],
+            'seconds': profile_seconds
+        })
+        for failure in failures:
+            failing_profiles.setdefault((failure.measure, failure.offset), []).append(file)
+    # every location that is impossible for at least one profile, with the profiles it is impossible for
+    locations = [{'measure': measure_number, 'offset': float(offset), 'impossible_for': files}
+                 for (measure_number, offset), files in sorted(failing_profiles.items())]
+    seconds['total'] = perf_counter() - start
+
+    report = {'score': score, 'output': output + '.json', 'cached': cached, 'profiles': profile_results,
+              'locations': locations, 'seconds': seconds}
+    with open(output + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+# constraints shared by the calls to batch_process_score in a batch worker process
+batch_constraints = None
+
+# sets up a batch worker process once, before it gets any scores
+# returns: void
+def init_batch_worker(compiled_constraints):
+    global batch_constraints
+    configure_environment()
+    batch_constraints = compiled_constraints
+
+# process_score for one file of a batch, its progress messages are dropped so they do not mix with the summaries
+# a score that cannot be processed is reported instead of stopping the batch
+# returns: summary
+def batch_process_score(score, output, options):
+    start = perf_counter()
+    try:
+        return process_score(score, output, batch_constraints, log=discard_message, **options)
+    except Exception as e:
+        return {'score': score, 'error': f'{type(e).__name__}: {e}', 'seconds': {'total': perf_counter() - start}}
+
+# score files in a directory, or matching a glob such as examples/*.mxl
+# returns: [file, ...]
+def find_scores(pattern):
+    if isdir(pattern):
+        return sorted(join(pattern, name) for name in listdir(pattern) if name.lower().endswith(SCORE_EXTENSIONS))
+    return sorted(glob(pattern))
+
+# output name of every score of a batch: its file name without the extension, in the output directory
+# raises ValueError if two scores would be written to the same name (song.xml and song.mxl, or two directories' song.xml)
+# returns: [(score, output), ...]
+def batch_outputs(scores, output_directory):
+    outputs = [(score, join(output_directory, splitext(basename(score))[0])) for score in scores]
+    first_scores = {}
+    for score, output in outputs:
+        if output in first_scores:
+            raise ValueError(f'{first_scores[output]} and {score} would both be written to {output}')
+        first_scores[output] = score
+    return outputs
+
+# validates every score of a directory or glob in a pool of worker processes
+# one json line is printed per score as soon as it is finished, in whatever order they finish
+# scores that would overwrite each other's output are refused before any is processed (see batch_outputs)
+# returns: all_playable
+def run_batch(pattern, output_directory, constraints, workers=None, **options):
+    outputs = batch_outputs(find_scores(pattern), output_directory)
+    makedirs(output_directory, exist_ok=True)
+
+    all_playable = True
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(constraints,)) as executor:
+        futures = [executor.submit(batch_process_score, score, output, options) for score, output in outputs]
+        for future in as_completed(futures):
+            summary = future.result()
+            all_playable = all_playable and summary.get('playable', False)
+            print(json.dumps(summary), flush=True)
+    return all_playable
+
+# sets up a worker process of the validation service like a batch worker, whose music21 environment setup loads
+# music21 before the first job
+# interrupting the service stops it through the main process, so the workers ignore the interrupt
+# returns: void
+def init_service_worker(compiled_constraints):
+    init_batch_worker(compiled_constraints)
+    signal(SIGINT, SIG_IGN)
+
+# jobs of the validation service that are waiting or running, and the latency of recent jobs
+class ServiceStats:
+    def __init__(self, workers, max_jobs):
+        self.lock = Lock()
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.jobs = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=SERVICE_LATENCY_WINDOW)
+
+    # takes a place for a new job
+    # returns: accepted (False if max_jobs jobs are already waiting or running)
+    def admit(self):
+        with self.lock:
+            if self.jobs >= self.max_jobs:
+                self.rejected += 1
+                return False
+            self.jobs += 1
+            return True
+
+    # gives back the place of a finished job
+    # returns: void
+    def finish(self, seconds, failed):
+        with self.lock:
+            self.jobs -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.latencies.append(seconds)
+
+    # returns: {'queue_depth': ..., 'running': ..., ..., 'latency': {'mean': ..., 'p50': ..., 'p95': ..., 'max': ...}}
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {'queue_depth': max(0, self.jobs - self.workers), 'running': min(self.jobs, self.workers),
+                     'workers': self.workers, 'max_jobs': self.max_jobs,
+                     'completed': self.completed, 'failed': self.failed, 'rejected': self.rejected}
+        if latencies:
+            stats['latency'] = {'jobs': len(latencies), 'mean': sum(latencies) / len(latencies),
+                                'p50': latencies[len(latencies) // 2], 'p95': latencies[min(len(latencies) - 1, len(latencies) * 95 // 100)],
+                                'max': latencies[-1]}
+        return stats
+
+# requests of the validation service, mixed into http.server's request handler by serve
+# POST /validate takes the score file as the request body (with ?name=file.mxl for its format), or ?path=file for a file
+# under the score root the service was started with (none by default, which turns ?path= off)
+# it returns the piano score as musicxml, or with ?check_only=1 the report of impossible chords as json
+# ?splitter=dp and ?first_failure=1 work like the command line flags; GET /stats returns the queue and latency statistics
+class ServiceHandler:
+    def do_GET(self):
+        if urlsplit(self.path).path != '/stats':
+            self.reply_json(404, {'error': 'not found'})
+            return
+        self.reply_json(200, self.server.stats.as_dict())
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        # the body is only read once the job is accepted, a refused request closes the connection instead
+        self.close_connection = True
+        if url.path != '/validate':
+            self.reply_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.reply_json(400, {'error': 'bad Content-Length'})
+            return
+        if length > self.server.max_body_size:
+            self.reply_json(413, {'error': f'scores are limited to {self.server.max_body_size} bytes'})
+            return
+        if not self.server.stats.admit():
+            # backpressure: the client should try again once a job has finished
+            self.reply_json(503, {'error': f'{self.server.stats.max_jobs} jobs are already waiting or running'}, {'Retry-After': '1'})
+            return
+        start = perf_counter()
+        failed = True
+        try:
+            body = self.rfile.read(length)
+            failed = self.run_job({name: values[-1] for name, values in parse_qs(url.query).items()}, body)
+        finally:
+            self.server.stats.finish(perf_counter() - start, failed)
+
+    # the score file ?path= names, which has to be under the score root (symbolic links are followed first)
+    # returns: file, or None if there is no score root or the path is not a score file under it
+    def score_path(self, path):
+        root = self.server.score_root
+        if root is None or not path.lower().endswith(SCORE_EXTENSIONS):
+            return None
+        score = realpath(join(root, path))
+        if commonpath([root, score]) != root or not isfile(score):
+            return None
+        return score
+
+    # validates one score on the worker pool and sends the result
+    # returns: failed
+    def run_job(self, query, body):
+        options = dict(self.server.options)
+        for flag, option in (('check_only', 'check_only'), ('first_failure', 'stop_at_first_failure')):
+            if flag in query:
+                options[option] = query[flag] in ('1', 'true', 'yes')
+        if query.get('splitter', options['splitter']) not in ('greedy', 'dp'):
+            self.reply_json(400, {'error': 'splitter must be greedy or dp'})
+            return True
+        options['splitter'] = query.get('splitter', options['splitter'])
+
+        job_directory = mkdtemp(dir=self.server.directory)
+        try:
+            if 'path' in query:
+                # the same reply whatever the reason, so it does not tell which files exist outside the score root
+                score = self.score_path(query['path'])
+                if score is None:
+                    self.reply_json(404, {'error': 'no such score under the score root'})
+                    return True
+                name = query['path']
+            elif body:
+                name = basename(query.get('name', 'score.musicxml'))
+                if not name.lower().endswith(SCORE_EXTENSIONS):
+                    self.reply_json(400, {'error': f'name must end in one of {", ".join(SCORE_EXTENSIONS)}'})
+                    return True
+                score = join(job_directory, name)
+                with open(score, 'wb') as f:
+                    f.write(body)
+            else:
+                self.reply_json(400, {'error': 'send the score as the request body or give its path'})
+                return True
+
+            summary = self.server.executor.submit(batch_process_score, score, join(job_directory, 'output'), options).result()
+            summary['score'] = name
+            if 'error' in summary:
+                self.reply_json(422, summary)
+                return True
+            if options['check_only']:
+                del summary['output']
+                self.reply_json(200, summary)
+            else:
+                with open(summary['output'], 'rb') as f:
+                    self.reply(200, f.read(), 'application/vnd.recordare.musicxml+xml',
+                               {'X-Playable': str(summary['playable']).lower(), 'X-Impossible-Chords': str(len(summary['failures']))})
+            return False
+        finally:
+            rmtree(job_directory, ignore_errors=True)
+
+    # returns: void
+    def reply(self, status, content, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    # returns: void
+    def reply_json(self, status, content, headers=None):
+        self.reply(status, json.dumps(content).encode(), 'application/json', headers)
+
+# runs the validation service on localhost until it is interrupted
+# the worker processes keep music21 loaded and the compiled constraints resident, so a job only costs reading and splitting its score
+# at most max_jobs jobs wait or run at a time, later ones are turned away with status 503 until a place frees up
+# ?path= only reads score files under score_root, and is turned off without one
+# returns: void
+def serve(port, constraints, workers=None, max_jobs=None, host='127.0.0.1', score_root=None, max_body_size=SERVICE_MAX_BODY_SIZE,
+          **options):
+    # http.server is only needed here, so it is not imported with the rest of the program
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    workers = workers or cpu_count() or 1
+    max_jobs = max_jobs or workers * SERVICE_JOBS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_service_worker, initargs=(constraints,)) as executor:
+        # start every worker before the first job, and before the server starts any threads
+        for future in [executor.submit(getpid) for _ in range(workers)]:
+            future.result()
+
+        server = ThreadingHTTPServer((host, port), type('ServiceRequestHandler', (ServiceHandler, BaseHTTPRequestHandler), {}))
+        server.daemon_threads = True
+        server.executor = executor
+        server.stats = ServiceStats(workers, max_jobs)
+        server.options = options
+        server.score_root = None if score_root is None else realpath(score_root)
+        server.max_body_size = max_body_size
+        server.directory = mkdtemp(prefix='music21_piano_validation_')
+        print(f'Serving on http://{host}:{server.server_address[1]} with {workers} workers', file=stderr, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            rmtree(server.directory, ignore_errors=True)
+
+# command line interface
+# returns: exit status
+def main(argv=None):
+    parser = ArgumentParser(description='Combines all parts of a score and splits them into playable left and right hand piano parts.',
+                            allow_abbrev=False)
+    parser.add_argument('score', nargs='?', help='original score file (.xml, .mxl or .musicxml), or a directory or glob with --batch')
+    parser.add_argument('output', nargs='?', help='output name (no extension), or an output directory with --batch')
+    parser.add_argument('constraints', nargs='?', help='finger constraint file (the only argument with --serve)')
+    parser.add_argument('--splitter', choices=['greedy', 'dp'], default='greedy',
+                        help='greedy repairs each chord in turn, dp picks every split in one global pass')
+    parser.add_argument('--check-only', action='store_true',
+                        help='only report the impossible chords (to output.json) instead of writing the piano score')
+    parser.add_argument('--first-failure', action='store_true',
+                        help='with --check-only, stop at the first impossible chord')
+    parser.add_argument('--extractor', choices=['sweep', 'chordify', 'stream'], default='sweep',
+                        help='sweep slices the parts into chords directly, chordify builds the combined score with music21, '
+                             'stream reads the chords straight from the musicxml without music21 (--check-only and --profiles)')
+    parser.add_argument('--batch', action='store_true',
+                        help='process every score of a directory or glob in parallel, printing a json line per score')
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes for --batch or --serve (default: one per cpu) or --profiles (default: none)')
+    parser.add_argument('--profiles', nargs='+', metavar='CONSTRAINTS',
+                        help='check the score against each of these finger constraint files, writing a matrix of impossible chords to output.json')
+    parser.add_argument('--no-cache', action='store_true', help='always parse the score instead of using the timeline cache')
+    parser.add_argument('--cache-dir', default=TIMELINE_CACHE_DIRECTORY, help='timeline cache directory')
+    parser.add_argument('--cache-size', type=int, default=TIMELINE_CACHE_SIZE // (1024 * 1024),
+                        help='timeline cache size limit in MB, least recently used scores are removed past it')
+    parser.add_argument('--split-workers', type=int,
+                        help='split the chords of a single score in segments on this many worker processes (greedy splitter only)')
+    parser.add_argument('--incremental', metavar='FILE',
+                        help='keep the split of the score in this file and only split the parts that changed since the last run (greedy splitter only)')
+    parser.add_argument('--stream-output', action='store_true',
+                        help='split and write the piano score a few measures at a time to keep memory down on very long scores (greedy splitter only)')
+    parser.add_argument('--instrument', metavar='FILE',
+                        help='count and time the work done splitting the chords and write it with the slowest measures to this json file')
+    parser.add_argument('--cprofile', metavar='FILE', help='profile the run with cProfile and dump the stats to this file')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='keep running as a validation service on this localhost port (0 picks a free one)')
+    parser.add_argument('--max-jobs', type=int,
+                        help=f'with --serve, jobs waiting or running before new ones are turned away (default: {SERVICE_JOBS_PER_WORKER} per worker)')
+    parser.add_argument('--max-body-size', type=int, default=SERVICE_MAX_BODY_SIZE // (1024 * 1024),
+                        help='with --serve, largest score file in MB accepted as a request body')
+    parser.add_argument('--score-root', metavar='DIRECTORY',
+                        help='with --serve, directory whose score files can be validated by ?path= (off by default)')
+    args = parser.parse_args(argv)
+    if args.serve is not None:
+        if args.output is not None:
+            parser.error('--serve only takes a finger constraint file')
+        if args.batch or args.profiles is not None or args.split_workers is not None:
+            parser.error('--serve does not work with --batch, --profiles or --split-workers')
+        if args.score_root is not None and not isdir(args.score_root):
+            parser.error(f'--score-root {args.score_root} is not a directory')
+        args.constraints, args.score = args.score, None
+    elif args.output is None:
+        parser.error('the score and output arguments are required')
+    if args.split_workers is not None and (args.batch or args.check_only or args.splitter != 'greedy'):
+        parser.error('--split-workers only works on a single score with the greedy splitter, without --check-only')
+    if args.profiles is not None and args.batch:
+        parser.error('--profiles only works on a single score')
+    if args.profiles is not None and args.constraints is not None:
+        parser.error('--profiles takes the finger constraint files instead of the constraints argument')
+    if args.extractor == 'stream' and not (args.check_only or args.profiles is not None or args.serve is not None):
+        parser.error('--extractor stream only works with --check-only, --profiles or --serve')
+    if args.incremental is not None and (args.batch or args.profiles is not None or args.serve is not None
+                                         or args.split_workers is not None or args.splitter != 'greedy'):
+        parser.error('--incremental only works on a single score with the greedy splitter, without --split-workers')
+    if args.stream_output and (args.batch or args.check_only or args.profiles is not None or args.serve is not None
+                               or args.split_workers is not None or args.incremental is not None or args.splitter != 'greedy'):
+        parser.error('--stream-output only works on a single score with the greedy splitter, without --check-only, '
+                     '--split-workers or --incremental')
+    if (args.instrument is not None or args.cprofile is not None) and (args.batch or args.profiles is not None or args.serve is not None
+                                                                       or args.split_workers is not None):
+        parser.error('--instrument and --cprofile only work on a single score, without --profiles or --split-workers')
+
+    if args.profiles is not None:
+        constraints = None
+    elif args.constraints is not None:
+        print('Reading finger constraints...', file=stderr if args.batch or args.serve is not None else stdout)
+        constraints = compile_constraints(create_constraints(args.constraints))
+    else:
+        print('No constraints specified', file=stderr if args.batch or args.serve is not None else stdout)
+        constraints = compile_constraints([])
+
+    options = {'splitter': args.splitter, 'extractor': args.extractor, 'check_only': args.check_only,
+               'stop_at_first_failure': args.first_failure,
+               'cache': None if args.no_cache else TimelineCache(args.cache_dir, args.cache_size * 1024 * 1024)}
+
+    if args.profiles is not None:
+        report = process_profiles(args.score, args.output, args.profiles, args.splitter, args.extractor, args.first_failure,
+                                  options['cache'], args.workers)
+        width = max(len(profile['constraints']) for profile in report['profiles'])
+        print(f'{"constraints":<{width}}  impossible  spacing  tie')
+        for profile in report['profiles']:
+            print(f'{profile["constraints"]:<{width}}  {profile["impossible_chords"]:>10}  {profile["spacing"]:>7}  {profile["tie"]:>3}')
+        return 0
+
+    if args.serve is not None:
+        serve(args.serve, constraints, args.workers, args.max_jobs, score_root=args.score_root,
+              max_body_size=args.max_body_size * 1024 * 1024, **options)
+        return 0
+
+    if args.batch:
+        try:
+            success = run_batch(args.score, args.output, constraints, args.workers, **options)
+        except ValueError as e:
+            parser.error(str(e))
+        return 0 if success else 1
+
+    # only needed to write the piano score
+    if not args.check_only:
+        configure_environment()
+
+    store = None if args.incremental is None else SplitStore(args.incremental)
+    if args.instrument is not None:
+        start_instrumentation()
+    profiler = None
+    if args.cprofile is not None:
+        from cProfile import Profile
+        profiler = Profile()
+        profiler.enable()
+    try:
+        result = process_score(args.score, args.output, constraints, split_workers=args.split_workers, store=store,
+                               stream_output=args.stream_output, **options)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        recorded = stop_instrumentation()
+    if profiler is not None:
+        profiler.dump_stats(args.cprofile)
+    if recorded is not None:
+        with open(args.instrument, 'w') as f:
+            json.dump({'score': args.score, 'stages': result['seconds'],
+                       'feasibility_cache': {'hits': feasibility_cache.hits, 'misses': feasibility_cache.misses},
+                       **recorded.report()}, f, indent=2)
+    success = result['playable']
+    if store is not None:
+        print(f'\nReused the split of {store.reused} segments, split {store.resplit} again.')
+    if result.get('peak_memory') is not None:
+        print(f'\nPeak memory: {result["peak_memory"]:.0f} MB')
+    if success:
+        print('\nPiece can be played by a piano.\n')
+    elif args.check_only:
+        print(f'\nPiece cannot be played by a piano ({len(result["failures"])} impossible chords).\n')
+    else:
+        print('\nPiece cannot be played by a piano.\n')
+    if args.check_only:
+        return 0 if success else 1
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
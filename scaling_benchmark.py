@@ -0,0 +1,220 @@
+from sys import exit
+from os import devnull, makedirs
+from os.path import dirname, join
+from time import perf_counter
+from random import Random
+from math import log
+from statistics import median
+from tempfile import mkdtemp
+from shutil import rmtree
+from contextlib import redirect_stdout
+from argparse import ArgumentParser
+import gc
+import json
+import tracemalloc
+
+from benchmark import STAGES, StageTimer, run_stages
+from music21_piano_validation import compile_constraints, create_constraints, peak_memory
+
+# measure counts of the synthetic scores the scaling benchmark runs by default
+SCALING_SIZES = (50, 100, 200, 400, 800, 1600)
+
+# midi pitch the synthetic voices are spread around (middle C)
+SYNTHETIC_CENTER = 60
+
+# stages faster than this at every size are left out of the growth estimate, their times are mostly noise
+GROWTH_MIN_SECONDS = 0.005
+# growth exponent past which a stage is reported as growing faster than linearly
+GROWTH_WARNING = 1.5
+
+# generates a 4/4 score of voice parts playing quarter notes, the same every time for the same arguments
+# density is the chance a voice plays on a beat instead of resting, tie_frequency the chance a note is tied over to
+# the next beat (across barlines too), and pitch_spread the range in semitones the voices share, each voice getting
+# its own band of it from the top part down
+# returns: score
+def generate_score(measures, voices=4, density=0.8, tie_frequency=0.2, pitch_spread=36, seed=0):
+    from music21 import clef, key, meter, note, pitch, stream, tie
+    random = Random(seed)
+    song = stream.Score()
+    band = pitch_spread / voices
+    lowest = SYNTHETIC_CENTER - pitch_spread / 2
+    for voice in range(voices):
+        low = round(lowest + band * (voices - 1 - voice))
+        high = max(low, round(lowest + band * (voices - voice)))
+        part = stream.Part()
+        part.partName = f'Voice {voice + 1}'
+        tied_pitch = None
+        for measure_number in range(1, measures + 1):
+            measure = stream.Measure(number=measure_number)
+            if measure_number == 1:
+                measure.coreInsert(0, clef.TrebleClef() if (low + high) / 2 >= SYNTHETIC_CENTER else clef.BassClef())
+                measure.coreInsert(0, key.KeySignature(0))
+                measure.coreInsert(0, meter.TimeSignature('4/4'))
+            for beat in range(4):
+                if tied_pitch is not None:
+                    midi = tied_pitch
+                elif random.random() < density:
+                    midi = random.randint(low, high)
+                else:
+                    midi = None
+
+                if midi is None:
+                    element = note.Rest(quarterLength=1)
+                else:
+                    element = note.Note(pitch.Pitch(midi=midi), quarterLength=1)
+                    # the last note of the score is never tied over
+                    ties_forward = (measure_number < measures or beat < 3) and random.random() < tie_frequency
+                    if tied_pitch is not None:
+                        element.tie = tie.Tie('continue' if ties_forward else 'stop')
+                    elif ties_forward:
+                        element.tie = tie.Tie('start')
+                    tied_pitch = midi if ties_forward else None
+                measure.coreInsert(beat, element)
+            measure.coreElementsChanged()
+            part.coreInsert((measure_number - 1) * 4, measure)
+        part.coreElementsChanged()
+        song.coreInsert(0, part)
+    song.coreElementsChanged()
+    return song
+
+# runs the stages on one synthetic score: repeats timed runs, then (with trace_memory) one run tracing memory
+# returns: {'measures': ..., 'generate_seconds': ..., 'seconds': {stage: median, ...}, 'memory': {stage: MB, ...}}
+def benchmark_size(measures, constraints, output_file, repeats=1, trace_memory=True, score_file=None, extractor='sweep',
+                   splitter='greedy', **generator_options):
+    start = perf_counter()
+    song = generate_score(measures, **generator_options)
+    generate_seconds = perf_counter() - start
+    if score_file is not None:
+        song.write('musicxml', score_file)
+
+    runs = []
+    with open(devnull, 'w') as quiet, redirect_stdout(quiet):
+        for _ in range(repeats):
+            gc.collect()
+            timer = StageTimer()
+            run_stages(song, constraints, output_file, timer, extractor, splitter)
+            runs.append(timer.seconds)
+        memory = {}
+        if trace_memory:
+            gc.collect()
+            timer = StageTimer(trace_memory=True)
+            tracemalloc.start()
+            try:
+                run_stages(song, constraints, output_file, timer, extractor, splitter)
+            finally:
+                tracemalloc.stop()
+            memory = timer.memory
+
+    seconds = {stage: median(run[stage] for run in runs) for stage in runs[0]}
+    return {'measures': measures, 'generate_seconds': generate_seconds, 'seconds': seconds, 'memory': memory}
+
+# estimates how fast the time of each stage grows with the number of measures, as the slope of a straight line
+# through log(time) against log(measures): about 1 for linear stages and 2 for quadratic ones
+# returns: {stage: exponent, ...}
+def growth_exponents(results):
+    exponents = {}
+    for stage in results[0]['seconds']:
+        points = [(log(result['measures']), log(result['seconds'][stage])) for result in results if result['seconds'][stage] > 0]
+        if len(points) < 2 or max(result['seconds'][stage] for result in results) < GROWTH_MIN_SECONDS:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        spread = sum((x - mean_x) ** 2 for x, _ in points)
+        if spread > 0:
+            exponents[stage] = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+    return exponents
+
+# plots the time and memory of each stage against the number of measures, on log scales so that the slope of a line
+# is how fast its stage grows
+# returns: void
+def plot_results(results, file):
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    figure, (time_axes, memory_axes) = pyplot.subplots(1, 2, figsize=(13, 5))
+    measures = [result['measures'] for result in results]
+    for stage in results[0]['seconds']:
+        time_axes.plot(measures, [result['seconds'][stage] for result in results], marker='o', label=stage)
+        if results[0]['memory']:
+            memory_axes.plot(measures, [result['memory'].get(stage, 0) for result in results], marker='o', label=stage)
+    for axes, label in ((time_axes, 'seconds'), (memory_axes, 'peak MB allocated')):
+        axes.set_xscale('log')
+        axes.set_yscale('log')
+        axes.set_xlabel('measures')
+        axes.set_ylabel(label)
+        axes.grid(True, which='both', alpha=0.3)
+    time_axes.set_title('time per stage')
+    memory_axes.set_title('memory per stage')
+    time_axes.legend(fontsize='small')
+    figure.tight_layout()
+    figure.savefig(file)
+    pyplot.close(figure)
+
+def main(argv=None):
+    here = dirname(__file__)
+    parser = ArgumentParser(description='Times each stage of the piano validation pipeline on synthetic scores of growing length.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SCALING_SIZES), help='measure counts of the synthetic scores')
+    parser.add_argument('--voices', type=int, default=4, help='number of voice parts')
+    parser.add_argument('--density', type=float, default=0.8, help='chance a voice plays on a beat instead of resting')
+    parser.add_argument('--tie-frequency', type=float, default=0.2, help='chance a note is tied over to the next beat')
+    parser.add_argument('--pitch-spread', type=int, default=36, help='range in semitones the voices share')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generator')
+    parser.add_argument('--constraints', default=join(here, 'finger_constraints.txt'), help='finger constraint file')
+    parser.add_argument('--repeats', type=int, default=1, help='timed runs of each size, the median of which is reported')
+    parser.add_argument('--extractor', choices=['sweep', 'chordify'], default='sweep', help='how the parts are combined into chords')
+    parser.add_argument('--splitter', choices=['greedy', 'dp'], default='greedy', help='how the chords are split into hands')
+    parser.add_argument('--no-write', action='store_true', help='stop after assembling the piano score instead of writing it')
+    parser.add_argument('--no-memory', action='store_true', help='skip the extra run that records the memory of each stage')
+    parser.add_argument('--write-scores', metavar='DIRECTORY', help='also write each synthetic score to this directory as musicxml')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--plot', default='scaling.png', help='file to plot time and memory against size to (default: scaling.png)')
+    args = parser.parse_args(argv)
+    if args.repeats < 1 or args.voices < 1 or min(args.sizes) < 1:
+        parser.error('--repeats, --voices and --sizes must be at least 1')
+    if not (0 <= args.density <= 1 and 0 <= args.tie_frequency <= 1):
+        parser.error('--density and --tie-frequency must be between 0 and 1')
+
+    constraints = compile_constraints(create_constraints(args.constraints))
+    generator_options = {'voices': args.voices, 'density': args.density, 'tie_frequency': args.tie_frequency,
+                         'pitch_spread': args.pitch_spread, 'seed': args.seed}
+    if args.write_scores is not None:
+        makedirs(args.write_scores, exist_ok=True)
+
+    stages = [stage for stage in STAGES if stage != 'parse' and not (stage == 'write' and args.no_write)]
+    print(f'{"measures":>9}{"generate":>10}' + ''.join(f'{stage[:12]:>13}' for stage in stages))
+    results = []
+    output_directory = mkdtemp()
+    try:
+        # one small run first so that the first size does not pay for loading music21's modules
+        benchmark_size(min(args.sizes), constraints, None, trace_memory=False, extractor=args.extractor, splitter=args.splitter,
+                       **generator_options)
+        for measures in sorted(args.sizes):
+            score_file = None if args.write_scores is None else join(args.write_scores, f'synthetic_{measures}.musicxml')
+            result = benchmark_size(measures, constraints, None if args.no_write else join(output_directory, 'scaling.musicxml'),
+                                    args.repeats, not args.no_memory, score_file, args.extractor, args.splitter, **generator_options)
+            results.append(result)
+            print(f'{measures:>9}{result["generate_seconds"]:>10.3f}' + ''.join(f'{result["seconds"][stage]:>13.3f}' for stage in stages),
+                  flush=True)
+    finally:
+        rmtree(output_directory, ignore_errors=True)
+
+    exponents = growth_exponents(results)
+    if exponents:
+        print('\nGrowth with the number of measures (1 is linear, 2 quadratic):')
+        for stage, exponent in exponents.items():
+            print(f'  {stage:<20}{exponent:>5.2f}' + ('  faster than linear' if exponent > GROWTH_WARNING else ''))
+    peak = peak_memory()
+    if peak is not None:
+        print(f'\nPeak memory: {peak:.0f} MB')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'generator': generator_options, 'extractor': args.extractor, 'splitter': args.splitter,
+                       'repeats': args.repeats, 'results': results, 'growth': exponents, 'peak_memory': peak}, f, indent=2)
+    if len(results) > 1:
+        plot_results(results, args.plot)
+        print(f'Plot written to {args.plot}')
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
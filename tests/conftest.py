@@ -0,0 +1,18 @@
+from os.path import abspath, dirname, join
+import sys
+
+# the program is a script in the root of the repository, not an installed package
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# scores every test that runs on the examples goes through
+EXAMPLES = join(ROOT, 'examples')
+FINGER_CONSTRAINTS = join(ROOT, 'finger_constraints.txt')
+
+# the chords and rests of a split hand, by measure, in a form that compares equal between splits giving the same hand
+# returns: {measure_number: [(offset, duration, [(note, tie, duration, error), ...]), ...], ...}
+def hand_events(hand):
+    return {measure_number: [(event.offset, event.duration,
+                              [(str(note_object), note_object.tie, note_object.duration, note_object.error) for note_object in event.notes or []])
+                             for event in events]
+            for measure_number, events in hand.measures.items()}
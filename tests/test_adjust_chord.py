@@ -0,0 +1,97 @@
+from os import listdir
+from os.path import join
+
+import pytest
+
+from conftest import EXAMPLES, FINGER_CONSTRAINTS
+from music21_piano_validation import (COLOR_CORRECT, COLOR_ERROR, adjust_chord, check_signatures_batch, check_spacing, check_ties,
+                                      color_notes, compile_constraints, create_constraints, extract_score, find_split_point,
+                                      pitch_key, pitch_signature, split_signatures)
+
+# the adjust_chord loop from before every split of a chord was evaluated up front, moving one note at a time between
+# the hands and checking the ties and spacing of both hands again after every move
+# returns: left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue
+def stepwise_adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints):
+    left_possible = False
+    right_possible = False
+    left_prev = True
+    right_prev = True
+    tie_loop = False
+    tie_issue = False
+    last_left_tie_issue = None
+    last_right_tie_issue = None
+
+    left_hand_notes = left_hand_notes[::-1]
+    right_hand_notes = list(right_hand_notes)
+
+    while not left_possible or not right_possible or tie_issue:
+        tie_issue = False
+        left_tie_issue = check_ties(left_hand_notes, last_right_pitches)
+        if left_tie_issue is None:
+            left_possible = check_spacing(left_hand_notes, constraints)
+        else:
+            tie_issue = True
+            left_possible = False
+
+        right_tie_issue = check_ties(right_hand_notes, last_left_pitches)
+        if right_tie_issue is None:
+            right_possible = check_spacing(right_hand_notes, constraints)
+        else:
+            tie_issue = True
+            right_possible = False
+
+        if left_possible != left_prev and right_possible != right_prev:
+            if not tie_issue or tie_loop:
+                color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
+                return left_hand_notes, right_hand_notes, False, last_left_tie_issue, last_right_tie_issue
+            elif tie_issue:
+                tie_loop = True
+
+        left_prev = left_possible
+        right_prev = right_possible
+
+        if not left_possible:
+            if not right_possible:
+                color_notes(left_hand_notes, right_hand_notes, COLOR_ERROR)
+                return left_hand_notes, right_hand_notes, False, last_left_tie_issue, last_right_tie_issue
+            right_hand_notes.insert(0, left_hand_notes.pop(0))
+        elif not right_possible:
+            left_hand_notes.insert(0, right_hand_notes.pop(0))
+
+        last_left_tie_issue = left_tie_issue
+        last_right_tie_issue = right_tie_issue
+
+    color_notes(left_hand_notes, right_hand_notes, COLOR_CORRECT)
+    return left_hand_notes, right_hand_notes, True, None, None
+
+# the parts of an adjust_chord result that have to match: the notes of each hand in order, success and both tie issues
+# (the tie issues are notes of the chord, so they are compared by identity)
+# returns: tuple
+def outcome(result):
+    left_hand_notes, right_hand_notes, success, left_tie_issue, right_tie_issue = result
+    return ([id(note_object) for note_object in left_hand_notes], [id(note_object) for note_object in right_hand_notes], success,
+            id(left_tie_issue), id(right_tie_issue))
+
+@pytest.fixture(scope='module')
+def constraints():
+    return compile_constraints(create_constraints(FINGER_CONSTRAINTS))
+
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_adjust_chord_matches_stepwise_loop(score, constraints):
+    timeline = extract_score(join(EXAMPLES, score)).timeline
+    last_left_pitches = set()
+    last_right_pitches = set()
+    chords = 0
+    for measure in timeline:
+        for chord_object in measure.chords:
+            left_hand_notes, right_hand_notes = find_split_point(chord_object.notes)
+            spacing = check_signatures_batch(split_signatures(pitch_signature(chord_object.notes)), constraints)
+            expected = outcome(stepwise_adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints))
+            result = adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints, spacing)
+            assert outcome(result) == expected, (measure.number, chord_object.offset)
+            assert outcome(adjust_chord(left_hand_notes, right_hand_notes, last_left_pitches, last_right_pitches, constraints)) == expected
+
+            last_left_pitches = {pitch_key(note_object) for note_object in result[0]}
+            last_right_pitches = {pitch_key(note_object) for note_object in result[1]}
+            chords += 1
+    assert chords > 0
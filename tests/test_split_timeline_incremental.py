@@ -0,0 +1,46 @@
+from os import listdir
+from os.path import join
+
+import pytest
+
+from conftest import EXAMPLES, FINGER_CONSTRAINTS, hand_events
+from music21_piano_validation import (SplitStore, compile_constraints, create_constraints, extract_score, pack_timeline, split_timeline,
+                                      split_timeline_incremental, tie_free_segments, unpack_timeline)
+
+@pytest.fixture(scope='module')
+def constraints():
+    return compile_constraints(create_constraints(FINGER_CONSTRAINTS))
+
+# drops the top note of the first chord from the middle of the piece on with more than one note and no ties, which
+# changes one segment without moving any tie free boundary
+# returns: edited packed timeline
+def edit_timeline(packed):
+    timeline = unpack_timeline(packed)
+    for measure in timeline[len(timeline) // 2:]:
+        for chord_object in measure.chords:
+            if len(chord_object.notes) > 1 and all(note_object.tie is None for note_object in chord_object.notes):
+                chord_object.notes.pop()
+                return pack_timeline(timeline)
+    raise AssertionError('no chord to edit')
+
+# returns: right_hand, left_hand, success, [failure, ...], [message, ...]
+def split(splitter, timeline, constraints, *args):
+    failures = []
+    messages = []
+    right_hand, left_hand, success = splitter(timeline, constraints, *args, failures, log=messages.append)
+    return hand_events(right_hand), hand_events(left_hand), success, [failure.as_dict() for failure in failures], messages
+
+# the stored splits of the unchanged segments are reused, and only the edited segment is split again, giving the
+# same result as splitting the edited timeline in order
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_split_timeline_incremental_after_edit(score, constraints, tmp_path):
+    packed = pack_timeline(extract_score(join(EXAMPLES, score)).timeline)
+    store = SplitStore(str(tmp_path / 'splits.pickle'))
+    assert split(split_timeline_incremental, unpack_timeline(packed), constraints, store) == split(split_timeline, unpack_timeline(packed), constraints)
+    assert store.reused == 0
+
+    edited = edit_timeline(packed)
+    store = SplitStore(str(tmp_path / 'splits.pickle'))
+    assert split(split_timeline_incremental, unpack_timeline(edited), constraints, store) == split(split_timeline, unpack_timeline(edited), constraints)
+    assert store.resplit == 1
+    assert store.reused == len(tie_free_segments(unpack_timeline(edited))) - 1
@@ -0,0 +1,33 @@
+from os import listdir
+from os.path import join
+
+import pytest
+
+from conftest import EXAMPLES, FINGER_CONSTRAINTS, hand_events
+from music21_piano_validation import (compile_constraints, create_constraints, extract_score, pack_timeline, split_timeline,
+                                      split_timeline_parallel, unpack_timeline)
+
+@pytest.fixture(scope='module')
+def constraints():
+    return compile_constraints(create_constraints(FINGER_CONSTRAINTS))
+
+# splitting the segments in worker processes and stitching them together gives the hands, impossible chords and
+# messages of splitting the whole timeline in order
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_split_timeline_parallel_matches_split_timeline(score, constraints):
+    # both splits get their own copy of the records
+    packed = pack_timeline(extract_score(join(EXAMPLES, score)).timeline)
+
+    messages = []
+    failures = []
+    right_hand, left_hand, success = split_timeline(unpack_timeline(packed), constraints, failures, log=messages.append)
+    parallel_messages = []
+    parallel_failures = []
+    parallel_right_hand, parallel_left_hand, parallel_success = split_timeline_parallel(unpack_timeline(packed), constraints, parallel_failures,
+                                                                                        3, parallel_messages.append)
+
+    assert hand_events(parallel_right_hand) == hand_events(right_hand)
+    assert hand_events(parallel_left_hand) == hand_events(left_hand)
+    assert parallel_success == success
+    assert [failure.as_dict() for failure in parallel_failures] == [failure.as_dict() for failure in failures]
+    assert parallel_messages == messages
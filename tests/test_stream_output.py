@@ -0,0 +1,55 @@
+from os import listdir
+from os.path import join
+import re
+from xml.etree.ElementTree import fromstring
+
+import pytest
+
+import music21_piano_validation
+from conftest import EXAMPLES, FINGER_CONSTRAINTS
+from music21_piano_validation import compile_constraints, create_constraints, discard_message, process_score
+from music21_piano_validation import beam_group_open
+
+@pytest.fixture(scope='module')
+def constraints():
+    return compile_constraints(create_constraints(FINGER_CONSTRAINTS))
+
+# the musicxml of a written score without what changes from one write to the next (the date and music21's random ids)
+# returns: content
+def normalized_musicxml(file):
+    with open(file, 'rb') as f:
+        content = f.read()
+    content = re.sub(rb'<encoding-date>.*</encoding-date>', b'', content)
+    return re.sub(rb'(id|part)="[PI][0-9a-f]+"', b'', content)
+
+# writing the piano score a chunk at a time gives the file written all at once, small chunks so that many chunks
+# end inside tied notes
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_stream_output_matches_write(score, constraints, tmp_path, monkeypatch):
+    monkeypatch.setattr(music21_piano_validation, 'STREAMED_CHUNK_MEASURES', 4)
+    written = process_score(join(EXAMPLES, score), str(tmp_path / 'written'), constraints, log=discard_message)
+    streamed = process_score(join(EXAMPLES, score), str(tmp_path / 'streamed'), constraints, stream_output=True, log=discard_message)
+
+    assert normalized_musicxml(streamed['output']) == normalized_musicxml(written['output'])
+    assert streamed['failures'] == written['failures']
+
+# none of the examples ends a chunk inside a beam group, so every chunk is made to wait for the next one here
+def test_stream_output_waits_for_beam_groups(constraints, tmp_path, monkeypatch):
+    score = join(EXAMPLES, sorted(listdir(EXAMPLES))[0])
+    monkeypatch.setattr(music21_piano_validation, 'STREAMED_CHUNK_MEASURES', 4)
+    monkeypatch.setattr(music21_piano_validation, 'beam_group_open', lambda measures: True)
+    written = process_score(score, str(tmp_path / 'written'), constraints, log=discard_message)
+    streamed = process_score(score, str(tmp_path / 'streamed'), constraints, stream_output=True, log=discard_message)
+
+    assert normalized_musicxml(streamed['output']) == normalized_musicxml(written['output'])
+
+# returns: [(number, measure), ...]
+def beamed_measures(*beams):
+    return [(i + 1, fromstring('<measure>' + ''.join('<note><beam number="%s">%s</beam></note>' % beam for beam in measure) + '</measure>'))
+            for i, measure in enumerate(beams)]
+
+def test_beam_group_open():
+    assert not beam_group_open(beamed_measures([('1', 'begin'), ('1', 'end')]))
+    assert beam_group_open(beamed_measures([('1', 'begin'), ('1', 'continue')]))
+    assert beam_group_open(beamed_measures([('1', 'begin'), ('1', 'end')], [('1', 'begin'), ('2', 'begin'), ('2', 'end')]))
+    assert not beam_group_open(beamed_measures([('1', 'begin')], [('1', 'continue'), ('1', 'end')]))
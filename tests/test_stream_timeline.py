@@ -0,0 +1,20 @@
+from os import listdir
+from os.path import join
+
+import pytest
+from music21 import converter
+
+from conftest import EXAMPLES
+from music21_piano_validation import extract_timeline, pack_timeline, stream_timeline
+
+# the stream extractor reads the musicxml itself, so it has to give the same chords and rests as chordify
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_stream_timeline_matches_chordify(score):
+    file = join(EXAMPLES, score)
+    streamed = stream_timeline(file)
+    assert streamed is not None
+
+    song = converter.parse(file)
+    part_count, timeline = streamed
+    assert part_count == len(song.parts)
+    assert pack_timeline(timeline) == pack_timeline(extract_timeline(song.chordify()))
@@ -0,0 +1,15 @@
+from os import listdir
+from os.path import join
+
+import pytest
+from music21 import converter
+
+from conftest import EXAMPLES
+from music21_piano_validation import extract_timeline, pack_timeline, sounding_score, sweep_timeline
+
+# the sweep is the default extractor and stands in for chordify, so it has to give the same chords and rests
+@pytest.mark.parametrize('score', sorted(listdir(EXAMPLES)))
+def test_sweep_timeline_matches_chordify(score):
+    song = converter.parse(join(EXAMPLES, score))
+    swept = sweep_timeline(sounding_score(song))
+    assert pack_timeline(swept) == pack_timeline(extract_timeline(song.chordify()))
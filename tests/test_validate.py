@@ -0,0 +1,28 @@
+from os import listdir
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+from conftest import EXAMPLES, FINGER_CONSTRAINTS
+from music21_piano_validation import compile_constraints, create_constraints, validate
+
+# returns: (playable, [failure, ...])
+def outcome(result):
+    return result.playable, [failure.as_dict() for failure in result.failures]
+
+# validate is called from the threads of long running workers, so it must not print or touch sys.stdout
+def test_validate_in_threads_leaves_stdout_alone(capfd):
+    constraints = compile_constraints(create_constraints(FINGER_CONSTRAINTS))
+    scores = [join(EXAMPLES, score) for score in sorted(listdir(EXAMPLES))[:3]]
+    expected = [outcome(validate(score, constraints)) for score in scores]
+    stdout = sys.stdout
+
+    # the scores start in a different order each round, so they do not always finish in the reverse of it
+    with ThreadPoolExecutor(max_workers=len(scores)) as executor:
+        for repeat in range(5):
+            order = [(i + repeat) % len(scores) for i in range(len(scores))]
+            results = executor.map(validate, [scores[i] for i in order], [constraints] * len(scores))
+            assert [outcome(result) for result in results] == [expected[i] for i in order]
+            assert sys.stdout is stdout
+
+    assert capfd.readouterr().out == ''